@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import numpy
+
+from shapely import ops as shapely_ops
+
+# Earth radius used by epsg:3857 (WGS 84 / Pseudo-Mercator).
+EARTH_RADIUS = 6378137.0
+
+
+class BufferEngine(object):
+    """This class creates buffers around routes in metric units.
+
+    .. note:: Route coordinates are projected from epsg:4326 to epsg:3857
+        with Pseudo-Mercator formulas on whole NumPy coordinate arrays, so no
+        projection object has to be created for a route. Buffer is created
+        in epsg:3857 and projected back to epsg:4326.
+
+    :arg buffer_distance: buffer distance in meters (epsg:3857 units)
+    :type buffer_distance: float
+
+    :arg quad_segs: number of segments used to approximate quarter circle
+        of buffer around line ends and joins
+    :type quad_segs: integer
+
+    :arg simplify_tolerance: tolerance in meters for simplifying route
+        before buffering, 0 means route is not simplified
+    :type simplify_tolerance: float
+
+    """
+
+    def __init__(self, buffer_distance=11, quad_segs=30, simplify_tolerance=0):
+        self.configure(
+            buffer_distance=buffer_distance,
+            quad_segs=quad_segs,
+            simplify_tolerance=simplify_tolerance
+        )
+
+    def configure(self, buffer_distance=11, quad_segs=30, simplify_tolerance=0):
+        """Changes buffer settings. Arguments are the same as for engine."""
+        self.buffer_distance = buffer_distance
+        self.quad_segs = quad_segs
+        self.simplify_tolerance = simplify_tolerance
+
+    def create_buffer(self, route):
+        """Creates buffer around provided route.
+
+        :arg route: shapely geometry representing route in epsg:4326
+        :type route: shapely.geometry.base.BaseGeometry
+
+        :returns: route buffer geometry in epsg:4326
+        :rtype: shapely.geometry.base.BaseGeometry
+
+        """
+        route_projected = shapely_ops.transform(self.to_mercator, route)
+
+        if self.simplify_tolerance:
+            route_projected = route_projected.simplify(
+                self.simplify_tolerance, preserve_topology=False
+            )
+
+        route_buffer = route_projected.buffer(
+            self.buffer_distance, self.quad_segs
+        )
+
+        return shapely_ops.transform(self.from_mercator, route_buffer)
+
+    def to_mercator(self, lon, lat):
+        """Projects coordinates from epsg:4326 to epsg:3857.
+
+        :arg lon: longitudes in degrees
+        :type lon: sequence
+
+        :arg lat: latitudes in degrees
+        :type lat: sequence
+
+        :returns: tuple of x and y arrays in meters
+        :rtype: (numpy.ndarray, numpy.ndarray)
+
+        """
+        x = EARTH_RADIUS * numpy.radians(lon)
+        y = EARTH_RADIUS * numpy.log(
+            numpy.tan(numpy.pi / 4 + numpy.radians(lat) / 2)
+        )
+
+        return x, y
+
+    def from_mercator(self, x, y):
+        """Projects coordinates from epsg:3857 to epsg:4326.
+
+        :arg x: x coordinates in meters
+        :type x: sequence
+
+        :arg y: y coordinates in meters
+        :type y: sequence
+
+        :returns: tuple of longitude and latitude arrays in degrees
+        :rtype: (numpy.ndarray, numpy.ndarray)
+
+        """
+        lon = numpy.degrees(numpy.asarray(x) / EARTH_RADIUS)
+        lat = numpy.degrees(
+            2 * numpy.arctan(numpy.exp(numpy.asarray(y) / EARTH_RADIUS)) -
+            numpy.pi / 2
+        )
+
+        return lon, lat
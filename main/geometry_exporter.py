@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+
+from osgeo import ogr, osr
+
+from utility import Utility
+
+UTILITY = Utility()
+
+
+class GeoJsonExporter(object):
+    """Exports each route geometry to separate GeoJson file in route
+    directory, e.g. route_5/pg_route_5.geojson, and route details to
+    details.txt file in route directory.
+    """
+
+    # Exporter writes to route directories.
+    uses_route_directories = True
+
+    def write_route(self, route_number, foldername, records):
+        """Writes geometries of one route to GeoJson files.
+
+        :arg route_number: ordinal of start-end location pair in input file
+        :type route_number: integer
+
+        :arg foldername: path to route directory
+        :type foldername: string
+
+        :arg records: list of dictionaries with geometry to export, e.g.
+            {'name': 'pg_route', 'layer': 'routes', 'provider': 'pgrouting',
+            'compared_to': None, 'geom': geom, 'geomtype': ogr.wkbLineString},
+            where geom is shapely geometry
+        :type records: list
+
+        """
+        for record in records:
+            UTILITY.create_geojson_file(
+                geom=ogr.CreateGeometryFromWkb(record['geom'].wkb),
+                geomtype=record['geomtype'],
+                filename=(
+                    foldername + '/' + record['name'] + '_' + str(route_number)
+                )
+            )
+
+    def write_details(self, route_number, foldername, details):
+        """Writes details of one route to details.txt file.
+
+        :arg route_number: ordinal of start-end location pair in input file
+        :type route_number: integer
+
+        :arg foldername: path to route directory
+        :type foldername: string
+
+        :arg details: text with route details and differences
+        :type details: string
+
+        """
+        with open(foldername + '/details.txt', 'w') as details_file:
+            details_file.write(details)
+
+    def is_exported(self, route_number):
+        """GeoJson files are written immediately, so route is exported when
+        its export stage is done.
+
+        :arg route_number: ordinal of start-end location pair in input file
+        :type route_number: integer
+
+        :returns: always True
+        :rtype: boolean
+
+        """
+        return True
+
+    def close(self):
+        """GeoJson files are closed after each write, nothing to do."""
+
+
+class GeoPackageExporter(object):
+    """Exports geometries of all routes to one GeoPackage file. Layers are
+    'routes', 'buffers' and 'differences'. Each feature has route_number and
+    provider attribute, differences also have compared_to attribute with
+    provider of the buffer. Route details are written to 'details' table
+    without geometry, with route_number and details attribute, so no route
+    directories are needed.
+
+    .. note:: Features are written in transactions of batch_size routes.
+        Transaction is counted when route details are written, which is the
+        last write of each route. Routes of uncommitted transaction are lost
+        if execution is killed, so is_exported should be checked before
+        route is skipped on resume.
+
+    :arg filename: path to GeoPackage file, existing file is extended
+    :type filename: string
+
+    :arg batch_size: number of routes written in one transaction
+    :type batch_size: integer
+
+    """
+
+    # Layer name --> geometry type. Geometries are converted to multi type.
+    LAYERS = {
+        'routes': ogr.wkbMultiLineString,
+        'buffers': ogr.wkbMultiPolygon,
+        'differences': ogr.wkbMultiLineString,
+    }
+
+    # Name of table with route details.
+    DETAILS_LAYER = 'details'
+
+    # Exporter writes all routes to one file.
+    uses_route_directories = False
+
+    def __init__(self, filename, batch_size=100):
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.routes_in_transaction = 0
+
+        if os.path.exists(filename):
+            self.data_source = ogr.Open(filename, 1)
+        else:
+            self.data_source = ogr.GetDriverByName('GPKG').CreateDataSource(
+                filename
+            )
+
+        self.layers = {}
+        for layer_name, geomtype in self.LAYERS.items():
+            layer = self.data_source.GetLayerByName(layer_name)
+
+            if layer is None:
+                layer = self.create_layer(layer_name, geomtype)
+
+            self.layers[layer_name] = layer
+
+        self.details_layer = self.data_source.GetLayerByName(
+            self.DETAILS_LAYER
+        )
+        if self.details_layer is None:
+            self.details_layer = self.create_details_layer()
+
+        # Routes whose geometries and details are already in the file of
+        # resumed execution.
+        self.exported_routes = self.get_exported_routes('routes')
+        self.detailed_routes = self.get_exported_routes(self.DETAILS_LAYER)
+
+        self.data_source.StartTransaction()
+
+    def create_layer(self, layer_name, geomtype):
+        """Creates layer with attribute columns and spatial index.
+
+        :arg layer_name: name of the layer, e.g. 'routes'
+        :type layer_name: string
+
+        :arg geomtype: identificator for type of ogr geometry
+        :type geomtype: integer
+
+        :returns: created layer
+        :rtype: osgeo.ogr.Layer
+
+        """
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(4326)
+
+        layer = self.data_source.CreateLayer(
+            layer_name,
+            srs=srs,
+            geom_type=geomtype,
+            options=['SPATIAL_INDEX=YES']
+        )
+
+        layer.CreateField(ogr.FieldDefn('route_number', ogr.OFTInteger))
+        layer.CreateField(ogr.FieldDefn('provider', ogr.OFTString))
+        layer.CreateField(ogr.FieldDefn('compared_to', ogr.OFTString))
+
+        return layer
+
+    def create_details_layer(self):
+        """Creates table without geometry for route details.
+
+        :returns: created layer
+        :rtype: osgeo.ogr.Layer
+
+        """
+        layer = self.data_source.CreateLayer(
+            self.DETAILS_LAYER, geom_type=ogr.wkbNone
+        )
+
+        layer.CreateField(ogr.FieldDefn('route_number', ogr.OFTInteger))
+        layer.CreateField(ogr.FieldDefn('details', ogr.OFTString))
+
+        return layer
+
+    def get_exported_routes(self, layer_name):
+        """Reads route numbers which are already in layer.
+
+        :arg layer_name: name of the layer, e.g. 'routes'
+        :type layer_name: string
+
+        :returns: set of route numbers
+        :rtype: set
+
+        """
+        result = self.data_source.ExecuteSQL(
+            'SELECT DISTINCT route_number FROM ' + layer_name
+        )
+
+        exported_routes = set(feature.GetField(0) for feature in result)
+
+        self.data_source.ReleaseResultSet(result)
+
+        return exported_routes
+
+    def write_route(self, route_number, foldername, records):
+        """Writes geometries of one route to GeoPackage layers. If the route
+        is already in the file, old features are deleted first.
+
+        :arg route_number: ordinal of start-end location pair in input file
+        :type route_number: integer
+
+        :arg foldername: path to route directory, not used
+        :type foldername: string
+
+        :arg records: list of dictionaries with geometry to export, e.g.
+            {'name': 'pg_route', 'layer': 'routes', 'provider': 'pgrouting',
+            'compared_to': None, 'geom': geom, 'geomtype': ogr.wkbLineString},
+            where geom is shapely geometry
+        :type records: list
+
+        """
+        # OGR data source can't be used from more threads at the same time.
+        with self.lock:
+            if route_number in self.exported_routes:
+                for layer_name in self.layers:
+                    self.data_source.ExecuteSQL(
+                        'DELETE FROM ' + layer_name +
+                        ' WHERE route_number = ' + str(int(route_number))
+                    )
+
+            for record in records:
+                layer = self.layers[record['layer']]
+
+                feature = ogr.Feature(layer.GetLayerDefn())
+                feature.SetField('route_number', route_number)
+                feature.SetField('provider', record['provider'])
+                if record['compared_to'] is not None:
+                    feature.SetField('compared_to', record['compared_to'])
+
+                # Empty difference is written as feature without geometry.
+                if not record['geom'].is_empty:
+                    # Shapely geometry is converted to ogr only for export.
+                    geom = ogr.CreateGeometryFromWkb(record['geom'].wkb)
+
+                    if self.LAYERS[record['layer']] == ogr.wkbMultiPolygon:
+                        geom = ogr.ForceToMultiPolygon(geom)
+                    else:
+                        geom = ogr.ForceToMultiLineString(geom)
+
+                    feature.SetGeometry(geom)
+
+                layer.CreateFeature(feature)
+
+            self.exported_routes.add(route_number)
+
+    def write_details(self, route_number, foldername, details):
+        """Writes details of one route to details table. If the route is
+        already in the table, old details are deleted first.
+
+        :arg route_number: ordinal of start-end location pair in input file
+        :type route_number: integer
+
+        :arg foldername: path to route directory, not used
+        :type foldername: string
+
+        :arg details: text with route details and differences
+        :type details: string
+
+        """
+        with self.lock:
+            if route_number in self.detailed_routes:
+                self.data_source.ExecuteSQL(
+                    'DELETE FROM ' + self.DETAILS_LAYER +
+                    ' WHERE route_number = ' + str(int(route_number))
+                )
+
+            feature = ogr.Feature(self.details_layer.GetLayerDefn())
+            feature.SetField('route_number', route_number)
+            feature.SetField('details', details)
+            self.details_layer.CreateFeature(feature)
+
+            self.detailed_routes.add(route_number)
+            self.routes_in_transaction += 1
+
+            if self.routes_in_transaction >= self.batch_size:
+                self.data_source.CommitTransaction()
+                self.data_source.StartTransaction()
+                self.routes_in_transaction = 0
+
+    def append_file(self, filename):
+        """Copies features of all layers and route details from other
+        GeoPackage file, e.g. when executions of shards are merged. Routes
+        which are already in the file are skipped.
+
+        :arg filename: path to GeoPackage file written by GeoPackageExporter
+        :type filename: string
+
+        """
+        source = ogr.Open(filename)
+
+        with self.lock:
+            # Routes copied from source must not be skipped in next layers.
+            skipped_routes = self.exported_routes | self.detailed_routes
+
+            layers = list(self.layers.items())
+            layers.append((self.DETAILS_LAYER, self.details_layer))
+
+            for layer_name, layer in layers:
+                source_layer = source.GetLayerByName(layer_name)
+
+                if source_layer is None:
+                    continue
+
+                if layer_name == self.DETAILS_LAYER:
+                    copied_routes = self.detailed_routes
+                else:
+                    copied_routes = self.exported_routes
+
+                for source_feature in source_layer:
+                    route_number = source_feature.GetField('route_number')
+
+                    if route_number in skipped_routes:
+                        continue
+
+                    feature = ogr.Feature(layer.GetLayerDefn())
+                    feature.SetFrom(source_feature)
+                    layer.CreateFeature(feature)
+
+                    copied_routes.add(route_number)
+
+        source = None
+
+    def is_exported(self, route_number):
+        """Checks if route is in the file. Details are written last, so route
+        with details has its geometries in the file as well.
+
+        :arg route_number: ordinal of start-end location pair in input file
+        :type route_number: integer
+
+        :returns: True if route details are in the file
+        :rtype: boolean
+
+        """
+        with self.lock:
+            return route_number in self.detailed_routes
+
+    def close(self):
+        """Commits last transaction and closes GeoPackage file."""
+        with self.lock:
+            self.data_source.CommitTransaction()
+            self.data_source = None
@@ -2,30 +2,44 @@
 import json
 import datetime as DT
 
-from shapely import wkt as shapely_wkt
-from shapely.geometry import MultiLineString
-from osgeo import ogr
+import numpy
+
+from shapely.geometry import LineString, MultiLineString
 
 # from google_polyline_decoder import decode_google_polyline
 from google_polyline_decoder import GooglePolylineDecoder
 from utility import Utility
+from rate_limiter import QuotaExceededError
 
 UTILITY = Utility()
 GOOGLE_POLYLINE_DECODER = GooglePolylineDecoder()
 
 
 class Google(object):
-    """This class handles google route."""
+    """This class handles google route.
+
+    :arg api_key: Google api key
+    :type api_key: string
+
+    :arg merge_parts: if True, polylines of all steps are joined to one
+        LineString, otherwise each step is separate part of MultiLineString
+    :type merge_parts: boolean
 
-    def __init__(self, api_key):
+    """
+
+    def __init__(self, api_key, merge_parts=False):
         self.base_url = (
             'https://maps.googleapis.com/maps/api/directions/json'
         )
+        self.matrix_url = (
+            'https://maps.googleapis.com/maps/api/distancematrix/json'
+        )
         self.api_key = api_key
+        self.merge_parts = merge_parts
 
     def get_route_data(self, start_coords, end_coords):
         """Executes function for making request to Google api and receives
-        route from Google. Converts route to shapely and ogr geometry,
+        route from Google. Converts route to shapely geometry,
         creates buffer around the route and extracts numerical attribute data
         like driving time and length.
 
@@ -54,33 +68,131 @@ class Google(object):
         route_data = UTILITY.make_service_request(
             base_url=self.base_url,
             key=self.api_key,
-            values=input_dict
+            values=input_dict,
+            provider='google',
+            validate=self.is_valid_response
         )
 
         route_json = json.loads(route_data)
 
-        route_shapely, route_ogr, route_distance, driving_time = (
+        # Google reports exceeded limits with status in response body.
+        if route_json['status'] in ('OVER_QUERY_LIMIT', 'OVER_DAILY_LIMIT'):
+            raise QuotaExceededError(
+                'Google responded with ' + route_json['status'] + '.'
+            )
+
+        route, route_distance, driving_time = (
             self.create_multilinestring(route_json=route_json)
         )
 
-        route_buffer_ogr = UTILITY.create_route_buffer(route=route_ogr)
-        route_buffer_shapely = shapely_wkt.loads(
-            route_buffer_ogr.ExportToWkt()
-        )
+        route_buffer = UTILITY.create_route_buffer(route=route)
 
         return {
-            'route_ogr': route_ogr,
-            'route_shapely': route_shapely,
-            'route_buffer_ogr': route_buffer_ogr,
-            'route_buffer_shapely': route_buffer_shapely,
+            'route': route,
+            'route_buffer': route_buffer,
             'driving_time': driving_time,
             'len': route_distance,
         }
 
+    def get_matrix_data(self, origins, destinations):
+        """Gets driving time and length of routes from each origin to each
+        destination with one Distance Matrix request. Route geometry is not
+        returned.
+
+        .. note:: Google allows at most 25 origins, 25 destinations and 100
+            elements (origins * destinations) in one request and bills each
+            element, so each element counts to rate limits and daily quota.
+
+        :arg origins: list of strings with starting location coordinates,
+            e.g. ['45.5,15.5']
+        :type origins: list
+
+        :arg destinations: list of strings with ending location coordinates,
+            e.g. ['43.5,16.5', '44.5,16.0']
+        :type destinations: list
+
+        :returns: list with row for each origin, row is list with dictionary
+            of route attribute data for each destination, or None if Google
+            didn't find the route
+        :rtype: list
+
+        """
+        input_dict = {
+            "origins": '|'.join(origins),
+            "destinations": '|'.join(destinations),
+            "mode": "driving",
+            "units": "metric",
+        }
+
+        matrix_data = UTILITY.make_service_request(
+            base_url=self.matrix_url,
+            key=self.api_key,
+            values=input_dict,
+            provider='google',
+            validate=self.is_valid_response,
+            cost=len(origins) * len(destinations)
+        )
+
+        matrix_json = json.loads(matrix_data)
+
+        if matrix_json['status'] in ('OVER_QUERY_LIMIT', 'OVER_DAILY_LIMIT'):
+            raise QuotaExceededError(
+                'Google responded with ' + matrix_json['status'] + '.'
+            )
+
+        if matrix_json['status'] != 'OK':
+            raise ValueError(
+                'Google responded with ' + matrix_json['status'] + '.'
+            )
+
+        return [
+            [
+                self.create_matrix_route_data(element)
+                for element in row['elements']
+            ]
+            for row in matrix_json['rows']
+        ]
+
+    def create_matrix_route_data(self, element):
+        """Creates route attribute data from Distance Matrix element.
+
+        :arg element: dictionary with google matrix element data
+        :type element: dictionary
+
+        :returns: dictionary with route attribute data, or None if Google
+            didn't find the route
+        :rtype: dictionary
+
+        """
+        if element['status'] != 'OK':
+            return None
+
+        duration = element['duration']['value']
+
+        return {
+            'driving_time': {
+                'sec': duration,
+                'hms': DT.timedelta(seconds=duration)
+            },
+            'len': element['distance']['value'] / 1000.0,
+        }
+
+    def is_valid_response(self, response_data):
+        """Checks if Google found the route, so the response can be cached.
+
+        :arg response_data: google response data
+        :type response_data: string
+
+        :returns: True if response status is OK
+        :rtype: boolean
+
+        """
+        return json.loads(response_data).get('status') == 'OK'
+
     def create_multilinestring(self, route_json):
         """Converts original google route data to more suitable format
-        for creating shapely and ogr geometry. Creates Shapely and Ogr
-        LineString geometries from route coordinates.
+        for creating shapely geometry. Creates Shapely MultiLineString
+        geometry from route coordinates.
 
         .. note:: Raw Google route data is in proprietary format, so
             GOOGLE_POLYLINE_DECODER is needed to convert it to more suitable
@@ -88,15 +200,21 @@ class Google(object):
             each route contains legs, each leg contains steps and each step
             contains encoded polyline points.
 
+        .. note:: When merge_parts is set, steps are joined to one LineString.
+            Each step starts at the last point of previous step, so these
+            duplicate junction points are dropped.
+
         :arg route_json: dictionary with google route data
         :type route_json: dictionary
 
-        :returns: tuple consisted of route's shapely and ogr geometry
-        :rtype: (shapely.geometry.linestring.LineString, osgeo.ogr.Geometry)
+        :returns: tuple consisted of route's shapely geometry, route length
+            in kilometers and driving time
+        :rtype: (shapely.geometry.MultiLineString or
+            shapely.geometry.LineString, float, dictionary)
 
         """
-        # List of all polylines.
-        polyline_list = []
+        # List of all encoded polylines.
+        point_strs = []
         route_distance = 0
         duration = 0
 
@@ -106,27 +224,33 @@ class Google(object):
                 duration += leg['duration']['value']
 
                 for step in leg['steps']:  # step is "edge"
-                    decoded_polyline = (
-                        GOOGLE_POLYLINE_DECODER.decode_google_polyline(
-                            point_str=step['polyline']['points']
-                        )
-                    )
-
-                    polyline_list.append(decoded_polyline)
-
-        # Create shapely multilinestring from list of polylines.
-        route_multilinestring_shapely = MultiLineString(polyline_list)
-        # Create ogr multilinestring
-        route_multilinestring_ogr = ogr.CreateGeometryFromWkb(
-            route_multilinestring_shapely.wkb
+                    point_strs.append(step['polyline']['points'])
+
+        # Polylines of all steps are decoded in one call.
+        coords, offsets = GOOGLE_POLYLINE_DECODER.decode_google_polylines(
+            point_strs=point_strs
         )
 
+        if self.merge_parts:
+            # Keep points which differ from previous point.
+            keep = numpy.ones(len(coords), dtype=bool)
+            keep[1:] = (coords[1:] != coords[:-1]).any(axis=1)
+            route_geometry = LineString(coords[keep])
+        else:
+            # Create shapely multilinestring from list of polylines. Steps
+            # with less than two distinct points can't be lines.
+            polyline_list = [
+                coords[start:end]
+                for start, end in zip(offsets[:-1], offsets[1:])
+                if end - start > 1
+            ]
+            route_geometry = MultiLineString(polyline_list)
+
         driving_time = {
             'sec': duration,
             'hms': DT.timedelta(seconds=duration)
         }
 
-        return (route_multilinestring_shapely,
-                route_multilinestring_ogr,
+        return (route_geometry,
                 route_distance,
                 driving_time)
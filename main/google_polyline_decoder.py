@@ -1,71 +1,114 @@
 # -*- coding: utf-8 -*-
+import numpy
 
-# Code taken from gist --> https://gist.github.com/signed0/2031157
+# Decoding algorithm is based on gist
+# --> https://gist.github.com/signed0/2031157
+# and vectorized with NumPy, so no Python loop runs over characters or points.
 
 
 class GooglePolylineDecoder(object):
+    """This class decodes polylines encoded with Google's algorithm
+    http://code.google.com/apis/maps/documentation/polylinealgorithm.html
 
-    def decode_google_polyline(self, point_str):
-        '''Decodes a polyline that has been encoded using Google's algorithm
-        http://code.google.com/apis/maps/documentation/polylinealgorithm.html
+    .. note:: Characters of all polylines are decoded at once as one NumPy
+        byte array, so decoding all steps of a route in one call with
+        decode_google_polylines is much faster than decoding them one by one.
 
-        This is a generic method that returns a list of (latitude, longitude)
-        tuples.
+    """
 
-        :param point_str: Encoded polyline string.
-        :type point_str: string
-        :returns: List of 2-tuples where each tuple is (latitude, longitude)
-        :rtype: list
-
-        '''
-
-        # sone coordinate offset is represented by 4 to 5 binary chunks
-        coord_chunks = [[]]
-        for char in point_str:
-
-            # convert each character to decimal from ascii
-            value = ord(char) - 63
-
-            # values that have a chunk following have an extra 1 on the left
-            split_after = not (value & 0x20)
-            value &= 0x1F
-
-            coord_chunks[-1].append(value)
-
-            if split_after:
-                    coord_chunks.append([])
-
-        del coord_chunks[-1]
+    def decode_google_polyline(self, point_str, precision=5):
+        """Decodes one encoded polyline.
 
-        coords = []
-
-        for coord_chunk in coord_chunks:
-            coord = 0
-
-            for i, chunk in enumerate(coord_chunk):
-                coord |= chunk << (i * 5)
-
-            #there is a 1 on the right if the coord is negative
-            if coord & 0x1:
-                coord = ~coord  # invert
-            coord >>= 1
-            coord /= 100000.0
-
-            coords.append(coord)
-
-        # convert the 1 dimensional list to a 2 dimensional list and offsets to
-        # actual values
-        points = []
-        prev_x = 0
-        prev_y = 0
-        for i in xrange(0, len(coords) - 1, 2):
-            if coords[i] == 0 and coords[i + 1] == 0:
-                continue
-
-            prev_x += coords[i + 1]
-            prev_y += coords[i]
-            # a round to 6 digits ensures that the floats are the same as when
-            # they were encoded
-            points.append((round(prev_x, 6), round(prev_y, 6)))
+        :arg point_str: encoded polyline string
+        :type point_str: string
 
-        return points
+        :arg precision: number of decimal places of encoded coordinates,
+            5 for Google polylines, 6 for more precise polylines
+        :type precision: integer
+
+        :returns: array of shape (N, 2) where each row is (longitude,
+            latitude)
+        :rtype: numpy.ndarray
+
+        """
+        coords, offsets = self.decode_google_polylines(
+            point_strs=[point_str], precision=precision
+        )
+
+        return coords
+
+    def decode_google_polylines(self, point_strs, precision=5):
+        """Decodes many encoded polylines in one pass.
+
+        .. note:: Points whose offset from previous point is zero are skipped,
+            so polylines don't contain duplicate consecutive vertices.
+
+        :arg point_strs: list of encoded polyline strings
+        :type point_strs: list
+
+        :arg precision: number of decimal places of encoded coordinates,
+            5 for Google polylines, 6 for more precise polylines
+        :type precision: integer
+
+        :returns: tuple consisted of array of shape (N, 2) with (longitude,
+            latitude) rows of all polylines and array of len(point_strs) + 1
+            offsets, where points of polyline i are
+            coords[offsets[i]:offsets[i + 1]]
+        :rtype: (numpy.ndarray, numpy.ndarray)
+
+        """
+        # Nothing to decode, e.g. Google returned no routes.
+        if not any(point_strs):
+            return (
+                numpy.zeros((0, 2)),
+                numpy.zeros(len(point_strs) + 1, dtype=numpy.int64)
+            )
+
+        # Convert each character to decimal from ascii.
+        data = numpy.frombuffer(
+            ''.join(point_strs).encode('ascii'), dtype=numpy.uint8
+        ).astype(numpy.int64) - 63
+
+        # Values that have a chunk following have an extra 1 on the left,
+        # so value ends with chunk without it.
+        value_ends = (data & 0x20) == 0
+        chunks = data & 0x1F
+
+        end_positions = numpy.flatnonzero(value_ends)
+        start_positions = numpy.concatenate(([0], end_positions[:-1] + 1))
+
+        # Chunk i of value is shifted by i * 5 bits, chunks don't overlap,
+        # so sum of shifted chunks is the same as bitwise or.
+        value_ids = numpy.cumsum(value_ends) - value_ends
+        shifts = (numpy.arange(len(data)) - start_positions[value_ids]) * 5
+        values = numpy.add.reduceat(chunks << shifts, start_positions)
+
+        # There is a 1 on the right if the value is negative.
+        values = numpy.where(values & 1, ~values, values) >> 1
+
+        # Number of values which end before start of each polyline.
+        char_offsets = numpy.cumsum([0] + [len(s) for s in point_strs])
+        value_offsets = numpy.concatenate(
+            ([0], numpy.cumsum(value_ends))
+        )[char_offsets]
+        point_offsets = value_offsets // 2
+
+        # Values are (latitude, longitude) offsets from previous point,
+        # running sum is restarted at first point of each polyline.
+        deltas = values.reshape(-1, 2)
+        positions = numpy.cumsum(deltas, axis=0)
+        polyline_starts = numpy.concatenate(
+            ([[0, 0]], positions)
+        )[point_offsets[:-1]]
+        positions -= numpy.repeat(
+            polyline_starts, numpy.diff(point_offsets), axis=0
+        )
+
+        keep = (deltas != 0).any(axis=1)
+        kept_offsets = numpy.concatenate(
+            ([0], numpy.cumsum(keep))
+        )[point_offsets]
+
+        coords = positions[keep][:, ::-1] / 10.0 ** precision
+
+        return coords, kept_offsets
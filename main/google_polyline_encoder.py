@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import numpy
+
+# Maximum number of 5 bit chunks of one encoded value. Longitude offset of
+# 360 degrees with precision 6 needs 6 chunks.
+MAX_CHUNKS = 7
+
+
+class GooglePolylineEncoder(object):
+    """This class encodes coordinates with Google's polyline algorithm
+    http://code.google.com/apis/maps/documentation/polylinealgorithm.html
+    Encoded polylines can be decoded with GooglePolylineDecoder using the
+    same precision.
+
+    .. note:: All coordinates are encoded at once with NumPy, no Python loop
+        runs over points.
+
+    """
+
+    def encode_google_polyline(self, coords, precision=5):
+        """Encodes coordinates to polyline string.
+
+        :arg coords: sequence of (longitude, latitude) pairs, e.g. array of
+            shape (N, 2) or coords of shapely LineString
+        :type coords: sequence
+
+        :arg precision: number of decimal places which are kept, 5 for
+            Google polylines, 6 for more precise polylines
+        :type precision: integer
+
+        :returns: encoded polyline string
+        :rtype: string
+
+        """
+        # Polyline points are (latitude, longitude) integers.
+        points = numpy.round(
+            numpy.asarray(coords, dtype=float).reshape(-1, 2)[:, ::-1] *
+            10 ** precision
+        ).astype(numpy.int64)
+
+        # First point is encoded as offset from (0, 0), others as offsets
+        # from previous point.
+        deltas = numpy.concatenate((points[:1], numpy.diff(points, axis=0)))
+        values = deltas.ravel()
+
+        # Negative value is inverted, so 1 on the right marks it.
+        values = numpy.where(values < 0, ~(values << 1), values << 1)
+
+        shifts = numpy.arange(MAX_CHUNKS) * 5
+        chunks = (values[:, None] >> shifts) & 0x1F
+
+        # Each value has at least one chunk, all chunks except the last one
+        # have an extra 1 on the left.
+        chunk_counts = numpy.maximum(
+            ((values[:, None] >> shifts) > 0).sum(axis=1), 1
+        )
+        chunk_indexes = numpy.arange(MAX_CHUNKS)[None, :]
+        chunks |= (chunk_indexes < chunk_counts[:, None] - 1) * 0x20
+
+        # Convert each chunk from decimal to ascii.
+        characters = (chunks + 63)[chunk_indexes < chunk_counts[:, None]]
+
+        return characters.astype(numpy.uint8).tobytes().decode('ascii')
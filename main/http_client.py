@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+import httplib
+import socket
+import time
+import urlparse
+import zlib
+import Queue
+
+# Response statuses after which request is sent again.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Response statuses after which request is sent to url in Location header.
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+# Maximum number of redirects followed for one request.
+MAX_REDIRECTS = 5
+
+
+class HttpError(Exception):
+    """Raised when service responds with error status.
+
+    :arg status: HTTP status code
+    :type status: integer
+
+    :arg url: requested url without query string (query contains api key)
+    :type url: string
+
+    """
+
+    def __init__(self, status, url):
+        Exception.__init__(
+            self, 'HTTP error ' + str(status) + ' for ' + url
+        )
+        self.status = status
+        self.url = url
+
+
+class HttpClient(object):
+    """This class sends GET requests over persistent connections. Idle
+    connections are kept in a pool for each host and reused by next requests,
+    so TCP and TLS handshake is done only once per connection. Responses are
+    requested gzip compressed. Failed requests and responses with 429 or 5xx
+    status are retried with exponential backoff. Redirects are followed.
+
+    .. note:: One client can be used from many threads at the same time.
+
+    :arg timeout: socket timeout in seconds
+    :type timeout: float
+
+    :arg retries: how many times failed request is sent again
+    :type retries: integer
+
+    :arg backoff: wait time in seconds before first retry, doubled for every
+        next retry
+    :type backoff: float
+
+    :arg pool_size: maximum number of idle connections kept for each host
+    :type pool_size: integer
+
+    """
+
+    def __init__(self, timeout=30, retries=3, backoff=0.5, pool_size=4):
+        self.pools = {}
+        self.configure(
+            timeout=timeout,
+            retries=retries,
+            backoff=backoff,
+            pool_size=pool_size
+        )
+
+    def configure(self, timeout=30, retries=3, backoff=0.5, pool_size=4):
+        """Changes client settings. Arguments are the same as for client.
+
+        .. note:: Connections that are already in pools are closed.
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+
+        self.close()
+
+    def get(self, url, before_attempt=None):
+        """Sends GET request and returns response body.
+
+        :arg url: full request url
+        :type url: string
+
+        :arg before_attempt: function called before each attempt, including
+            retries, e.g. rate limiter acquire. Exception raised by function
+            stops the request.
+        :type before_attempt: function
+
+        :returns: decompressed response body
+        :rtype: string
+
+        :raises HttpError: if service responds with error status, or with
+            redirect without location or after MAX_REDIRECTS redirects
+
+        """
+        parsed_url, host_key, path = self.split_url(url)
+
+        attempt = 0
+        redirects = 0
+        while True:
+            if before_attempt is not None:
+                before_attempt()
+
+            connection = self.get_connection(host_key)
+
+            try:
+                connection.request('GET', path, headers={
+                    'Accept-Encoding': 'gzip',
+                    'Connection': 'keep-alive',
+                })
+                response = connection.getresponse()
+                response_data = response.read()
+            except (httplib.HTTPException, socket.error):
+                # Connection is broken, don't put it back to pool.
+                connection.close()
+
+                if attempt >= self.retries:
+                    raise
+
+                self.wait(attempt)
+                attempt += 1
+                continue
+
+            if response.getheader('connection', '').lower() == 'close':
+                connection.close()
+            else:
+                self.release_connection(host_key, connection)
+
+            if response.status in RETRY_STATUSES and attempt < self.retries:
+                self.wait(attempt, response.getheader('retry-after'))
+                attempt += 1
+                continue
+
+            location = response.getheader('location')
+            if (response.status in REDIRECT_STATUSES and location and
+                    redirects < MAX_REDIRECTS):
+                url = urlparse.urljoin(url, location)
+                parsed_url, host_key, path = self.split_url(url)
+                redirects += 1
+                continue
+
+            if response.status >= 300:
+                raise HttpError(
+                    status=response.status,
+                    url=urlparse.urlunsplit(parsed_url[:3] + ('', ''))
+                )
+
+            if response.getheader('content-encoding', '').lower() == 'gzip':
+                # 16 + MAX_WBITS tells zlib to expect gzip header.
+                response_data = zlib.decompress(
+                    response_data, 16 + zlib.MAX_WBITS
+                )
+
+            return response_data
+
+    def split_url(self, url):
+        """Splits url to parts needed for request.
+
+        :arg url: full request url
+        :type url: string
+
+        :returns: tuple (parsed url, host key, path with query string)
+        :rtype: tuple
+
+        """
+        parsed_url = urlparse.urlsplit(url)
+        host_key = (parsed_url.scheme, parsed_url.netloc)
+
+        path = parsed_url.path or '/'
+        if parsed_url.query:
+            path += '?' + parsed_url.query
+
+        return parsed_url, host_key, path
+
+    def get_connection(self, host_key):
+        """Returns idle connection from host pool or creates new one.
+
+        :arg host_key: tuple (scheme, host), e.g. ('https', 'example.com')
+        :type host_key: tuple
+
+        :returns: connection to host
+        :rtype: httplib.HTTPConnection
+
+        """
+        try:
+            return self.get_pool(host_key).get_nowait()
+        except Queue.Empty:
+            scheme, host = host_key
+
+            if scheme == 'https':
+                return httplib.HTTPSConnection(host, timeout=self.timeout)
+
+            return httplib.HTTPConnection(host, timeout=self.timeout)
+
+    def release_connection(self, host_key, connection):
+        """Puts connection back to host pool. If pool is full, connection is
+        closed.
+
+        :arg host_key: tuple (scheme, host), e.g. ('https', 'example.com')
+        :type host_key: tuple
+
+        :arg connection: connection to host
+        :type connection: httplib.HTTPConnection
+
+        """
+        try:
+            self.get_pool(host_key).put_nowait(connection)
+        except Queue.Full:
+            connection.close()
+
+    def get_pool(self, host_key):
+        """Returns pool of idle connections for host.
+
+        :arg host_key: tuple (scheme, host), e.g. ('https', 'example.com')
+        :type host_key: tuple
+
+        :returns: queue with idle connections
+        :rtype: Queue.LifoQueue
+
+        """
+        # setdefault is atomic, so two threads never get different pools.
+        return self.pools.setdefault(
+            host_key, Queue.LifoQueue(maxsize=self.pool_size)
+        )
+
+    def wait(self, attempt, retry_after=None):
+        """Sleeps before request is sent again. Wait time is doubled with
+        every attempt, unless service sent Retry-After header in seconds.
+        Retry-After is limited to backoff * 2 ** retries seconds, so service
+        can't stall the worker for long.
+
+        :arg attempt: number of already failed attempts
+        :type attempt: integer
+
+        :arg retry_after: value of Retry-After response header
+        :type retry_after: string
+
+        """
+        if retry_after and retry_after.isdigit():
+            time.sleep(
+                min(int(retry_after), self.backoff * 2 ** self.retries)
+            )
+        else:
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def close(self):
+        """Closes all idle connections."""
+        pools = self.pools
+        self.pools = {}
+
+        for pool in pools.values():
+            while True:
+                try:
+                    pool.get_nowait().close()
+                except Queue.Empty:
+                    break
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import csv
+import json
+import os
+
+
+class LocationsReader(object):
+    """This class reads start-end location pairs from input file.
+
+    Supported formats are chosen by file extension:
+        - .jsonl --> one location pair per line,
+          e.g. {"start": {"x": 15.5, "y": 45.5}, "end": {"x": 16.5, "y": 43.5}}
+        - .csv --> header start_x,start_y,end_x,end_y and one location pair
+          per row, e.g. 15.5,45.5,16.5,43.5
+        - any other --> JSON list of location pairs (locations.txt format)
+
+    JSON Lines and CSV files are read lazily, one location pair at a time.
+    """
+
+    def read_locations(self, filename):
+        """Returns generator of location pairs from input file.
+
+        :arg filename: path to input file with locations
+        :type filename: string
+
+        :returns: generator of dictionaries with start and end coordinates
+            like in locations.txt
+        :rtype: generator
+
+        """
+        extension = os.path.splitext(filename)[1].lower()
+
+        if extension == '.jsonl':
+            return self.read_json_lines(filename)
+        elif extension == '.csv':
+            return self.read_csv(filename)
+        else:
+            return self.read_json(filename)
+
+    def read_json(self, filename):
+        """Reads JSON list of location pairs.
+
+        .. note:: Whole file is loaded into memory. Use JSON Lines or CSV
+            for large inputs.
+
+        :arg filename: path to input file with locations
+        :type filename: string
+
+        :returns: generator of location pairs
+        :rtype: generator
+
+        """
+        locations_file = open(filename, 'r')
+        locations_list = json.load(locations_file)
+        locations_file.close()
+
+        for location in locations_list:
+            yield location
+
+    def read_json_lines(self, filename):
+        """Reads location pairs from JSON Lines file. Empty lines are skipped.
+
+        :arg filename: path to input file with locations
+        :type filename: string
+
+        :returns: generator of location pairs
+        :rtype: generator
+
+        """
+        with open(filename, 'r') as locations_file:
+            for line in locations_file:
+                line = line.strip()
+
+                if line:
+                    yield json.loads(line)
+
+    def read_csv(self, filename):
+        """Reads location pairs from CSV file with start_x, start_y, end_x
+        and end_y columns.
+
+        :arg filename: path to input file with locations
+        :type filename: string
+
+        :returns: generator of location pairs
+        :rtype: generator
+
+        """
+        with open(filename, 'rb') as locations_file:
+            for row in csv.DictReader(locations_file):
+                yield {
+                    'start': {
+                        'x': float(row['start_x']),
+                        'y': float(row['start_y']),
+                    },
+                    'end': {
+                        'x': float(row['end_x']),
+                        'y': float(row['end_y']),
+                    },
+                }
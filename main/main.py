@@ -1,130 +1,840 @@
 # -*- coding: utf-8 -*-
+import argparse
 import json
 import os
+import sys
 import datetime
-import psycopg2
+import traceback
+
+from multiprocessing.pool import ThreadPool
+from psycopg2.pool import ThreadedConnectionPool
 
 from utility import Utility
 from pgrouting import PgRouting
 from google import Google
 from mapquest import MapQuest
 from routes_processor import RoutesProcessor
+from pipeline import Pipeline
+from locations_reader import LocationsReader
+from matrix_batcher import MatrixBatcher
+from manifest import RunManifest
+from geometry_exporter import GeoJsonExporter, GeoPackageExporter
+from route_storage import EncodedRoutesWriter
 
 UTILITY = Utility()
+LOCATIONS_READER = LocationsReader()
+
+# Providers in order of comparison. Route data of provider is stored in job
+# under provider name + '_data', e.g. 'pgrouting_data'.
+PROVIDERS = ('pgrouting', 'mapquest', 'google')
 
 
 class Main(object):
     """Main class for application.
 
-    :arg connection: psycopg2 connection for database
-    :type connection: psycopg2._psycopg.connection
+    :arg connection_pool: pool of psycopg2 connections for database
+    :type connection_pool: psycopg2.pool.ThreadedConnectionPool
 
     :arg output_dir: directory for saving output files
     :type output_dir: string
 
+    :arg config: dictionary with database information, api keys and
+        execution settings
+    :type config: dictionary
+
+    :arg resume_dir: directory of interrupted execution which should be
+        continued. Routes completed in that execution are skipped.
+    :type resume_dir: string
+
+    :arg shard: tuple (shard index, number of shards). If set, only routes
+        with route_number % number of shards == shard index are processed.
+    :type shard: tuple
+
     """
 
-    def __init__(self, connection, output_dir, config):
-        self.connection = connection
-        self.cursor = connection.cursor()
+    def __init__(
+            self, connection_pool, output_dir, config, resume_dir=None,
+            shard=None):
+        self.connection_pool = connection_pool
         self.output_dir = output_dir
         self.config = config
+        self.shard = shard
+
+        UTILITY.configure_http_client(settings=config.get('http', {}))
+        UTILITY.configure_buffer_engine(settings=config.get('buffer', {}))
+
+        rate_limits_config = config.get('rate_limits', {})
+        UTILITY.configure_rate_limiter(
+            providers=rate_limits_config.get('providers', {}),
+            budget_file=rate_limits_config.get(
+                'budget_file', '../output_data/daily_budget.json')
+        )
+
+        cache_config = dict(config.get('cache', {}))
+        if cache_config.pop('enabled', False):
+            UTILITY.configure_response_cache(settings=cache_config)
+
+        # Continue interrupted execution or start new one.
+        if resume_dir:
+            self.time_named_dir = os.path.abspath(resume_dir)
+        else:
+            self.time_named_dir = self.create_execution_directory()
+
+        self.manifest = RunManifest(run_dir=self.time_named_dir)
+
+        self.PgRouting = self.create_pgrouting()
+        self.Google = Google(
+            config['google_api_key'],
+            merge_parts=config.get('merge_parts', False)
+        )
+        self.MapQuest = MapQuest(
+            config['mapquest_api_key'],
+            shape_format=config.get('mapquest_shape_format', 'raw')
+        )
+        self.RoutesProcessor = RoutesProcessor(
+            processes=self.get_geometry_processes(),
+            exporter=self.create_exporter()
+        )
+        self.encoded_routes_writer = self.create_encoded_routes_writer()
 
-        self.PgRouting = PgRouting(cursor=self.cursor)
-        self.Google = Google(config['google_api_key'])
-        self.MapQuest = MapQuest(config['mapquest_api_key'])
-        self.RoutesProcessor = RoutesProcessor()
+        # Thread pool for fetching routes from all providers at the same time.
+        # Pool size limits number of provider requests running concurrently.
+        self.provider_pool = ThreadPool(
+            processes=config.get('provider_concurrency', 3)
+        )
 
-        self.time_named_dir = self.create_execution_directory()
         self.run()
 
     def run(self):
         """Main application function. Reads input file with locations for
-        routing, executes method that creates output directory for routes,
-        executes functions for getting routes, executes functions for
-        processing routes.
+        routing and executes routes processing, either route by route or
+        through the staged pipeline when pipeline mode is enabled in config.
+        In matrix mode only driving times and lengths are compared.
         """
-        # Open and read input file with locations. File content looks like
-        # [{"start": {"x": 15.5, "y": 45.5},"end": {"x": 16.5, "y": 43.5}}].
-        locations_file = open('locations.txt', 'r')
-        locations_file_content = locations_file.read()
+        # Read input file with locations lazily. Default file content looks
+        # like [{"start": {"x": 15.5, "y": 45.5},"end": {"x": 16.5, "y": 43.5}}]
+        # but JSON Lines and CSV files can be used as well.
+        locations = LOCATIONS_READER.read_locations(
+            filename=self.config.get('locations_file', 'locations.txt')
+        )
+
+        if self.config.get('mode', 'routes') == 'matrix':
+            self.run_matrix(locations)
+        elif self.config.get('pipeline', {}).get('enabled', False):
+            self.run_pipeline(locations)
+        else:
+            self.run_sequential(locations)
+
+        failed_routes = self.manifest.get_failed_routes()
+        self.write_run_info(failed_routes=failed_routes)
+
+        if failed_routes:
+            print (
+                'Failed routes: ' + ', '.join(map(str, failed_routes)) +
+                '. Run again with --resume ' + self.time_named_dir +
+                ' to process them.'
+            )
+
+        self.manifest.close()
+
+        # Stop provider threads and geometry processes.
+        self.provider_pool.close()
+        self.provider_pool.join()
+        self.RoutesProcessor.close()
+        if self.encoded_routes_writer is not None:
+            self.encoded_routes_writer.close()
 
-        # Convert string to json
-        locations_list = json.loads(locations_file_content)
+        # Close DB connections.
+        self.connection_pool.closeall()
+
+    def run_sequential(self, locations):
+        """Processes routes one after another. For each location pair executes
+        functions for getting routes, functions for processing routes and
+        functions for writing results to route directory.
+
+        :arg locations: iterable with start-end location pairs
+        :type locations: iterable
+
+        """
+        stages = [
+            ('routing', self.routing_stage),
+            ('geometry', self.geometry_stage),
+            ('export', self.export_stage),
+        ]
 
         # For each location pair (start-end)...
-        for route_number in range(len(locations_list)):
-            foldername = self.create_route_directory(route_number)
+        for job in self.create_jobs(locations):
+            for stage_name, stage_function in stages:
+                try:
+                    job = stage_function(job)
+                except Exception:
+                    self.handle_stage_error(stage_name, job, sys.exc_info())
+                    break
 
-            start_coords = locations_list[route_number]['start']
-            end_coords = locations_list[route_number]['end']
+                self.handle_stage_complete(stage_name, job)
 
-            # String with starting coordinates for route, e.g. '45.5,15.5'
-            start_coords_string = (
-                str(start_coords['y']) + ', ' + str(start_coords['x'])
-            )
+    def run_pipeline(self, locations):
+        """Processes routes with staged pipeline. Database, network, geometry
+        and export work run in separate stages with their own workers, so
+        database, network and processor cores are used at the same time.
+
+        .. note:: Number of workers for each stage and size of queues between
+            stages are set in "pipeline" part of config.
+
+        .. note:: Database stage takes up to "batch_sizes" waiting routes
+            and snaps locations of all of them with one query.
+
+        .. note:: MapQuest and Google requests run in separate stages, so
+            when one service is throttled by rate limiter, requests to the
+            other service go on until the queue between them is full.
+
+        :arg locations: iterable with start-end location pairs
+        :type locations: iterable
+
+        """
+        pipeline_config = self.config['pipeline']
+        workers = pipeline_config.get('workers', {})
+
+        pipeline = Pipeline(
+            stages=[
+                {
+                    'name': 'database',
+                    'function': self.database_stage,
+                    'batch_function': self.database_batch_stage,
+                    'batch_size': pipeline_config.get(
+                        'batch_sizes', {}).get('database', 1),
+                    'workers': workers.get('database', 1),
+                },
+                {
+                    'name': 'mapquest',
+                    'function': self.mapquest_stage,
+                    'workers': workers.get('mapquest', 2),
+                },
+                {
+                    'name': 'google',
+                    'function': self.google_stage,
+                    'workers': workers.get('google', 2),
+                },
+                {
+                    'name': 'geometry',
+                    'function': self.geometry_stage,
+                    'workers': workers.get('geometry', 2),
+                },
+                {
+                    'name': 'export',
+                    'function': self.export_stage,
+                    'workers': workers.get('export', 1),
+                },
+            ],
+            queue_size=pipeline_config.get('queue_size', 50),
+            on_error=self.handle_stage_error,
+            on_complete=self.handle_stage_complete
+        )
+
+        pipeline.run(self.create_jobs(locations))
+
+    def run_matrix(self, locations):
+        """Compares only driving time and length of routes. Routes are
+        grouped to matrix requests and each provider gets driving times and
+        lengths for the whole group with one matrix request or query, route
+        geometries are not fetched.
+
+        .. note:: Routes are grouped by MatrixBatcher within "buffer_size"
+            consecutive location pairs, so the whole locations file isn't
+            held in memory. Other limits are set in "matrix" part of config.
+
+        :arg locations: iterable with start-end location pairs
+        :type locations: iterable
+
+        """
+        matrix_config = self.config.get('matrix', {})
+
+        batcher = MatrixBatcher(
+            batch_size=matrix_config.get('batch_size', 25),
+            max_elements=matrix_config.get('max_elements', 100),
+            max_elements_per_pair=matrix_config.get(
+                'max_elements_per_pair', 1),
+            coordinate_precision=matrix_config.get('coordinate_precision', 5)
+        )
+
+        batches = batcher.create_batches(
+            jobs=self.create_jobs(locations),
+            buffer_size=matrix_config.get('buffer_size', 1000)
+        )
+
+        for batch in batches:
+            try:
+                jobs = self.matrix_stage(batch)
+            except Exception:
+                exc_info = sys.exc_info()
+                for job in batch['jobs']:
+                    self.handle_stage_error('matrix', job, exc_info)
+                continue
+
+            for job in jobs:
+                self.handle_stage_complete('matrix', job)
+
+                try:
+                    job = self.matrix_export_stage(job)
+                except Exception:
+                    self.handle_stage_error('export', job, sys.exc_info())
+                    continue
+
+                self.handle_stage_complete('export', job)
+
+    def create_jobs(self, locations):
+        """Creates jobs for location pairs. Routes which belong to other
+        shards or are already complete in run manifest are skipped.
+
+        :arg locations: iterable with start-end location pairs
+        :type locations: iterable
+
+        :returns: generator of jobs
+        :rtype: generator
+
+        """
+        for route_number, location in enumerate(locations):
+            if self.shard and route_number % self.shard[1] != self.shard[0]:
+                continue
+
+            # Route is complete if it is exported as well, GeoPackage may
+            # miss last routes of killed execution.
+            if (self.manifest.is_complete(route_number) and
+                    self.RoutesProcessor.exporter.is_exported(route_number)):
+                continue
+
+            yield self.create_job(route_number=route_number, location=location)
+
+    def create_job(self, route_number, location):
+        """Creates dictionary with input data for routing one location pair.
 
-            # String with ending coordinates for route, e.g. '43.5,16.5'
-            end_coords_string = (
+        :arg route_number: ordinal of start-end location pair in file
+        :type route_number: integer
+
+        :arg location: start-end location pair, e.g.
+            {"start": {"x": 15.5, "y": 45.5},"end": {"x": 16.5, "y": 43.5}}
+        :type location: dictionary
+
+        :returns: dictionary with route number and coordinates
+        :rtype: dictionary
+
+        """
+        start_coords = location['start']
+        end_coords = location['end']
+
+        return {
+            'route_number': route_number,
+            'start_coords': start_coords,
+            'end_coords': end_coords,
+            # String with starting coordinates for route, e.g. '45.5, 15.5'
+            'start_coords_string': (
+                str(start_coords['y']) + ', ' + str(start_coords['x'])
+            ),
+            # String with ending coordinates for route, e.g. '43.5, 16.5'
+            'end_coords_string': (
                 str(end_coords['y']) + ', ' + str(end_coords['x'])
+            ),
+        }
+
+    def write_run_info(self, failed_routes):
+        """Writes run_info.json summary file to execution directory.
+
+        :arg failed_routes: route numbers of failed routes
+        :type failed_routes: list
+
+        """
+        if self.shard:
+            shard = str(self.shard[0]) + '/' + str(self.shard[1])
+        else:
+            shard = None
+
+        run_info = {
+            'shard': shard,
+            'locations_file': self.config.get(
+                'locations_file', 'locations.txt'),
+            'completed_routes': len(self.manifest.get_completed_routes()),
+            'failed_routes': failed_routes,
+        }
+
+        with open(self.time_named_dir + '/run_info.json', 'w') as info_file:
+            json.dump(run_info, info_file, indent=4)
+
+    def handle_stage_complete(self, stage_name, job):
+        """Records finished stage of route in run manifest.
+
+        :arg stage_name: name of finished stage
+        :type stage_name: string
+
+        :arg job: dictionary with route data
+        :type job: dictionary
+
+        """
+        self.manifest.mark_done(
+            route_number=job['route_number'],
+            stage=stage_name
+        )
+
+    def handle_stage_error(self, stage_name, job, exc_info):
+        """Prints error and records failed stage of route in run manifest.
+
+        :arg stage_name: name of failed stage
+        :type stage_name: string
+
+        :arg job: dictionary with route data
+        :type job: dictionary
+
+        :arg exc_info: exception info returned from sys.exc_info()
+        :type exc_info: tuple
+
+        """
+        print (
+            'Route ' + str(job['route_number']) + ' failed in stage ' +
+            stage_name + '.'
+        )
+        traceback.print_exception(*exc_info)
+
+        error = traceback.format_exception_only(exc_info[0], exc_info[1])
+        self.manifest.mark_failed(
+            route_number=job['route_number'],
+            stage=stage_name,
+            error=error[-1].strip()
+        )
+
+    def routing_stage(self, job):
+        """Stage which gets routes from all providers at the same time.
+
+        :arg job: dictionary with route number and coordinates
+        :type job: dictionary
+
+        :returns: job with added pgrouting, mapquest and google route data
+        :rtype: dictionary
+
+        """
+        job['pgrouting_data'], job['mapquest_data'], job['google_data'] = (
+            self.fetch_routes_data(
+                start_coords=job['start_coords'],
+                end_coords=job['end_coords'],
+                start_coords_string=job['start_coords_string'],
+                end_coords_string=job['end_coords_string'],
             )
+        )
+
+        return job
+
+    def database_stage(self, job):
+        """Pipeline stage which gets route from PgRouting.
+
+        :arg job: dictionary with route number and coordinates
+        :type job: dictionary
+
+        :returns: job with added pgrouting route data
+        :rtype: dictionary
+
+        """
+        job['pgrouting_data'] = self.PgRouting.get_route_data(
+            start_coords=job['start_coords'],
+            end_coords=job['end_coords'],
+        )
 
-            pgrouting_data = (
-                self.PgRouting.get_route_data(
-                    start_coords=start_coords,
-                    end_coords=end_coords,
+        return job
+
+    def database_batch_stage(self, jobs):
+        """Pipeline stage which gets routes of many jobs from PgRouting.
+        Starting and ending locations of all jobs are snapped to way
+        vertices with one query, then each job is routed separately.
+
+        .. note:: Routing error of one job doesn't affect other jobs, only
+            failed job is reported and dropped by pipeline.
+
+        :arg jobs: list of dictionaries with route number and coordinates
+        :type jobs: list
+
+        :returns: list of (job, exc_info) tuples, where job has added
+            pgrouting route data and exc_info is None if routing succeeded
+        :rtype: list
+
+        """
+        vertex_ids = self.PgRouting.get_way_vertices(coords_list=[
+            coords
+            for job in jobs
+            for coords in (job['start_coords'], job['end_coords'])
+        ])
+
+        results = []
+
+        for index, job in enumerate(jobs):
+            try:
+                job['pgrouting_data'] = self.PgRouting.get_route_data(
+                    start_coords=job['start_coords'],
+                    end_coords=job['end_coords'],
+                    start_vertex_id=vertex_ids[2 * index],
+                    end_vertex_id=vertex_ids[2 * index + 1],
                 )
-            )
+            except Exception:
+                results.append((job, sys.exc_info()))
+            else:
+                results.append((job, None))
+
+        return results
+
+    def mapquest_stage(self, job):
+        """Pipeline stage which gets route from MapQuest.
+
+        :arg job: dictionary with route number and coordinates
+        :type job: dictionary
+
+        :returns: job with added mapquest route data
+        :rtype: dictionary
+
+        """
+        job['mapquest_data'] = self.MapQuest.get_route_data(
+            start_coords=job['start_coords_string'],
+            end_coords=job['end_coords_string'],
+        )
+
+        return job
+
+    def google_stage(self, job):
+        """Pipeline stage which gets route from Google.
+
+        :arg job: dictionary with route number and coordinates
+        :type job: dictionary
+
+        :returns: job with added google route data
+        :rtype: dictionary
+
+        """
+        job['google_data'] = self.Google.get_route_data(
+            start_coords=job['start_coords_string'],
+            end_coords=job['end_coords_string'],
+        )
+
+        return job
+
+    def geometry_stage(self, job):
+        """Stage which calculates differences between routes geometries.
+
+        :arg job: dictionary with routes data
+        :type job: dictionary
+
+        :returns: job with added difference geometries
+        :rtype: dictionary
+
+        """
+        job['differences'] = self.RoutesProcessor.compute_differences(
+            routes_data=self.get_routes_data(job)
+        )
+
+        return job
+
+    def export_stage(self, job):
+        """Stage which writes route geometries, differences and details with
+        route exporter, e.g. to route directory.
+
+        :arg job: dictionary with routes data and difference geometries
+        :type job: dictionary
+
+        :returns: finished job
+        :rtype: dictionary
+
+        """
+        foldername = self.create_route_directory(job['route_number'])
 
-            mapquest_data = (
-                self.MapQuest.get_route_data(
-                    start_coords=start_coords_string,
-                    end_coords=end_coords_string,
+        routes_data = self.get_routes_data(job)
+
+        self.RoutesProcessor.export_geometries(
+            routes_data=routes_data,
+            differences=job['differences'],
+            route_number=job['route_number'],
+            foldername=foldername
+        )
+        self.RoutesProcessor.process_attributes(
+            routes_data=routes_data,
+            route_number=job['route_number'],
+            foldername=foldername
+        )
+
+        if self.encoded_routes_writer is not None:
+            self.encoded_routes_writer.write_route(
+                route_number=job['route_number'],
+                routes=dict(
+                    (provider, data['route'])
+                    for provider, data in routes_data
                 )
             )
 
-            google_data = (
-                self.Google.get_route_data(
-                    start_coords=start_coords_string,
-                    end_coords=end_coords_string,
-                )
+        return job
+
+    def matrix_stage(self, batch):
+        """Stage which gets driving times and lengths of batch of routes
+        from all providers at the same time.
+
+        :arg batch: batch of jobs created by MatrixBatcher
+        :type batch: dictionary
+
+        :returns: jobs with added pgrouting, mapquest and google attribute
+            data, which is None if provider didn't find the route
+        :rtype: list
+
+        """
+        pgrouting_result = self.provider_pool.apply_async(
+            self.PgRouting.get_matrix_data,
+            kwds={
+                'origins': batch['origins'],
+                'destinations': batch['destinations'],
+            }
+        )
+
+        mapquest_result = self.provider_pool.apply_async(
+            self.MapQuest.get_matrix_data,
+            kwds={
+                'origins': batch['origin_strings'],
+                'destinations': batch['destination_strings'],
+            }
+        )
+
+        google_result = self.provider_pool.apply_async(
+            self.Google.get_matrix_data,
+            kwds={
+                'origins': batch['origin_strings'],
+                'destinations': batch['destination_strings'],
+            }
+        )
+
+        # Wait for all providers.
+        pgrouting_matrix = pgrouting_result.get()
+        mapquest_matrix = mapquest_result.get()
+        google_matrix = google_result.get()
+
+        # Each job takes its cell from matrix of each provider.
+        for job, (origin_index, destination_index) in zip(
+                batch['jobs'], batch['cells']):
+            job['pgrouting_data'] = (
+                pgrouting_matrix[origin_index][destination_index]
+            )
+            job['mapquest_data'] = (
+                mapquest_matrix[origin_index][destination_index]
             )
+            job['google_data'] = google_matrix[origin_index][destination_index]
+
+        return batch['jobs']
+
+    def matrix_export_stage(self, job):
+        """Stage which writes route details and attribute differences of
+        matrix mode to route directory.
+
+        :arg job: dictionary with routes attribute data
+        :type job: dictionary
 
-            self.RoutesProcessor.process_geometry(
-                pgrouting_data=pgrouting_data,
-                mapquest_data=mapquest_data,
-                google_data=google_data,
-                route_number=route_number,
-                foldername=foldername
+        :returns: finished job
+        :rtype: dictionary
+
+        """
+        missing_providers = [
+            provider
+            for provider in PROVIDERS
+            if job[provider + '_data'] is None
+        ]
+
+        if missing_providers:
+            raise ValueError(
+                'Route not found by ' + ', '.join(missing_providers) + '.'
             )
-            self.RoutesProcessor.process_attributes(
-                pgrouting_data=pgrouting_data,
-                mapquest_data=mapquest_data,
-                google_data=google_data,
-                route_number=route_number,
-                foldername=foldername
+
+        foldername = self.create_route_directory(job['route_number'])
+
+        self.RoutesProcessor.process_attributes(
+            routes_data=self.get_routes_data(job),
+            route_number=job['route_number'],
+            foldername=foldername
+        )
+
+        return job
+
+    def get_routes_data(self, job):
+        """Collects route data of all providers from job.
+
+        :arg job: dictionary with routes data
+        :type job: dictionary
+
+        :returns: list of (provider name, route data) tuples
+        :rtype: list
+
+        """
+        return [(provider, job[provider + '_data']) for provider in PROVIDERS]
+
+    def fetch_routes_data(
+            self,
+            start_coords,
+            end_coords,
+            start_coords_string,
+            end_coords_string):
+        """Gets route data from PgRouting, MapQuest and Google at the same
+        time. Each provider request runs in provider thread pool, so waiting
+        for a route takes as long as the slowest provider.
+
+        .. note:: Exception raised in a provider thread is raised again here.
+
+        :arg start_coords: dictionary with route starting location coordinates,
+            e.g. {"x": 15.5, "y": 45.5}
+        :type start_coords: dictionary
+
+        :arg end_coords: dictionary with route ending location coordinates,
+            e.g. {"x": 16.5, "y": 43.5}
+        :type end_coords: dictionary
+
+        :arg start_coords_string: string with route starting location
+            coordinates, e.g. '45.5, 15.5'
+        :type start_coords_string: string
+
+        :arg end_coords_string: string with route ending location
+            coordinates, e.g. '43.5, 16.5'
+        :type end_coords_string: string
+
+        :returns: tuple consisted of pgrouting, mapquest and google route data
+        :rtype: (dictionary, dictionary, dictionary)
+
+        """
+        pgrouting_result = self.provider_pool.apply_async(
+            self.PgRouting.get_route_data,
+            kwds={
+                'start_coords': start_coords,
+                'end_coords': end_coords,
+            }
+        )
+
+        mapquest_result = self.provider_pool.apply_async(
+            self.MapQuest.get_route_data,
+            kwds={
+                'start_coords': start_coords_string,
+                'end_coords': end_coords_string,
+            }
+        )
+
+        google_result = self.provider_pool.apply_async(
+            self.Google.get_route_data,
+            kwds={
+                'start_coords': start_coords_string,
+                'end_coords': end_coords_string,
+            }
+        )
+
+        # Wait for all providers.
+        return (pgrouting_result.get(),
+                mapquest_result.get(),
+                google_result.get())
+
+    def create_pgrouting(self):
+        """Creates PgRouting object with settings from config. PgRouting
+        borrows connections from connection pool, so it is shared by all
+        threads.
+
+        :returns: PgRouting object
+        :rtype: pgrouting.PgRouting
+
+        """
+        pgrouting_config = self.config.get('pgrouting', {})
+
+        return PgRouting(
+            connection_pool=self.connection_pool,
+            merge_parts=self.config.get('merge_parts', False),
+            bbox_margin=pgrouting_config.get('bbox_margin', 0),
+            bbox_attempts=pgrouting_config.get('bbox_attempts', 3),
+            prepared_costs=pgrouting_config.get('prepared_costs', False),
+            aggregate_route=pgrouting_config.get('aggregate_route', False)
+        )
+
+    def get_geometry_processes(self):
+        """Returns number of geometry worker processes defined by
+        geometry_processes in config.
+
+        .. note:: Worker processes are used only in pipeline mode, where
+            many geometry stage workers send routes to them at the same
+            time. In sequential mode each route would wait for its worker
+            process, so differences are calculated in main process. Matrix
+            mode doesn't calculate differences.
+
+        :returns: number of worker processes, 0 if they are not used
+        :rtype: integer
+
+        """
+        processes = self.config.get('geometry_processes', 0)
+
+        if processes and (
+                self.config.get('mode', 'routes') == 'matrix' or
+                not self.config.get('pipeline', {}).get('enabled', False)):
+            print (
+                'Setting geometry_processes is used only in pipeline mode, '
+                'differences are calculated in main process.'
+            )
+            return 0
+
+        return processes
+
+    def create_exporter(self):
+        """Creates route geometries exporter defined by export_format in
+        config.
+
+        :returns: GeoJsonExporter for "geojson" format, which writes GeoJson
+            files to route directories, or GeoPackageExporter for "gpkg"
+            format, which writes all routes to routes.gpkg file in execution
+            directory
+        :rtype: geometry_exporter.GeoJsonExporter or
+            geometry_exporter.GeoPackageExporter
+
+        """
+        export_format = self.config.get('export_format', 'geojson')
+
+        if export_format == 'gpkg':
+            return GeoPackageExporter(
+                filename=self.time_named_dir + '/routes.gpkg',
+                batch_size=self.config.get('export_batch_size', 100)
             )
 
-        # Close DB connection.
-        self.cursor.close()
-        self.connection.close()
+        return GeoJsonExporter()
+
+    def create_encoded_routes_writer(self):
+        """Creates writer of encoded routes file if it is enabled in
+        "encoded_routes" part of config.
+
+        :returns: writer of routes_encoded.jsonl file in execution directory
+            or None if encoded routes file is disabled
+        :rtype: route_storage.EncodedRoutesWriter
+
+        """
+        encoded_routes_config = self.config.get('encoded_routes', {})
+
+        if not encoded_routes_config.get('enabled', False):
+            return None
+
+        return EncodedRoutesWriter(
+            run_dir=self.time_named_dir,
+            precision=encoded_routes_config.get('precision', 5)
+        )
 
     def create_route_directory(self, route_number):
-        """Creates directory for specific route.
+        """Creates directory for specific route if route exporter uses route
+        directories. GeoPackage exporter writes everything to one file.
 
         :arg route_number: ordinal of start-end location pair in file
         :type route_number: integer
 
-        :returns: name of created directory
+        :returns: name of created directory or None if route directories
+            are not used
         :rtype: string
 
         """
-        # Create directory named by route number.
+        if not self.RoutesProcessor.exporter.uses_route_directories:
+            return None
+
+        # Create directory named by route number. Directory may already
+        # exist if route failed in resumed execution.
         route_directory = (
             self.time_named_dir +
             '/route_' + str(route_number)
         )
-        os.mkdir(route_directory)
+        if not os.path.isdir(route_directory):
+            os.mkdir(route_directory)
 
         return route_directory
 
@@ -150,12 +860,58 @@ class Main(object):
         return time_named_dir
 
 
+def parse_shard(value):
+    """Converts --shard argument to tuple.
+
+    :arg value: shard argument, e.g. '2/8'
+    :type value: string
+
+    :returns: tuple (shard index, number of shards), e.g. (2, 8)
+    :rtype: tuple
+
+    """
+    try:
+        index, count = [int(part) for part in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('shard must look like i/N')
+
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError('shard index must be in 0..N-1')
+
+    return (index, count)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Compare routes from PgRouting, Mapquest and Google.'
+    )
+    parser.add_argument(
+        '--resume',
+        metavar='RUN_DIR',
+        help='continue interrupted execution in RUN_DIR directory'
+    )
+    parser.add_argument(
+        '--shard',
+        metavar='i/N',
+        type=parse_shard,
+        help='process only routes with route number %% N == i'
+    )
+    args = parser.parse_args()
+
     config_file = open('config.txt', 'r')
     config_content = config_file.read()
     config = json.loads(config_content)
 
-    connection = psycopg2.connect(
+    # Pool must have connection for each thread which queries database at
+    # the same time, e.g. for each pipeline database worker.
+    pool_size = max(
+        config['database'].get('pool_size', 1),
+        config.get('pipeline', {}).get('workers', {}).get('database', 1)
+    )
+
+    connection_pool = ThreadedConnectionPool(
+        minconn=1,
+        maxconn=pool_size,
         database=config['database']['name'],
         user=config['database']['user'],
         password=config['database']['password'],
@@ -164,4 +920,10 @@ if __name__ == '__main__':
 
     output_dir = os.path.abspath('../output_data')
 
-    Main(connection=connection, output_dir=output_dir, config=config)
+    Main(
+        connection_pool=connection_pool,
+        output_dir=output_dir,
+        config=config,
+        resume_dir=args.resume,
+        shard=args.shard
+    )
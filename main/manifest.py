@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+
+
+class RunManifest(object):
+    """This class records which stages are finished for each route of an
+    execution. Records are appended to manifest.jsonl file in execution
+    directory, one JSON object per line, e.g.
+    {"route": 5, "stage": "export", "status": "done"}.
+    Interrupted execution can be resumed by reading records of its manifest.
+
+    :arg run_dir: execution directory
+    :type run_dir: string
+
+    :arg final_stage: name of last stage, route is complete when this stage
+        is done
+    :type final_stage: string
+
+    """
+
+    def __init__(self, run_dir, final_stage='export'):
+        self.filename = os.path.join(run_dir, 'manifest.jsonl')
+        self.final_stage = final_stage
+        self.lock = threading.Lock()
+
+        # Dictionary route number --> set of done stages.
+        self.done_stages = {}
+        # Dictionary route number --> name of failed stage.
+        self.failed_stages = {}
+
+        line_complete = True
+        if os.path.exists(self.filename):
+            line_complete = self.load()
+
+        self.manifest_file = open(self.filename, 'a')
+
+        # Start new line after incomplete record.
+        if not line_complete:
+            self.manifest_file.write('\n')
+
+    def load(self):
+        """Reads records of existing manifest file.
+
+        :returns: False if last line of manifest file is incomplete
+        :rtype: boolean
+
+        """
+        line = '\n'
+
+        with open(self.filename, 'r') as manifest_file:
+            for line in manifest_file:
+                # Last line may be incomplete if execution was killed.
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+
+                self.add_record(record)
+
+        return line.endswith('\n')
+
+    def add_record(self, record):
+        """Updates done and failed stages with manifest record.
+
+        :arg record: manifest record
+        :type record: dictionary
+
+        """
+        route_number = record['route']
+
+        if record['status'] == 'done':
+            self.done_stages.setdefault(route_number, set()).add(
+                record['stage']
+            )
+            if record['stage'] == self.final_stage:
+                self.failed_stages.pop(route_number, None)
+        else:
+            self.failed_stages[route_number] = record['stage']
+
+    def write_record(self, record):
+        """Adds record to manifest and appends it to manifest file.
+
+        :arg record: manifest record
+        :type record: dictionary
+
+        """
+        with self.lock:
+            self.add_record(record)
+            self.manifest_file.write(json.dumps(record) + '\n')
+            self.manifest_file.flush()
+
+    def mark_done(self, route_number, stage):
+        """Records that stage is finished for route.
+
+        :arg route_number: ordinal of start-end location pair in input file
+        :type route_number: integer
+
+        :arg stage: name of finished stage
+        :type stage: string
+
+        """
+        self.write_record({
+            'route': route_number,
+            'stage': stage,
+            'status': 'done',
+        })
+
+    def mark_failed(self, route_number, stage, error):
+        """Records that stage failed for route.
+
+        :arg route_number: ordinal of start-end location pair in input file
+        :type route_number: integer
+
+        :arg stage: name of failed stage
+        :type stage: string
+
+        :arg error: error message
+        :type error: string
+
+        """
+        self.write_record({
+            'route': route_number,
+            'stage': stage,
+            'status': 'failed',
+            'error': error,
+        })
+
+    def is_complete(self, route_number):
+        """Checks if all stages are finished for route.
+
+        :arg route_number: ordinal of start-end location pair in input file
+        :type route_number: integer
+
+        :returns: True if final stage is done for route
+        :rtype: boolean
+
+        """
+        with self.lock:
+            return self.final_stage in self.done_stages.get(
+                route_number, ()
+            )
+
+    def get_completed_routes(self):
+        """Returns route numbers of routes with final stage done.
+
+        :returns: sorted list of route numbers
+        :rtype: list
+
+        """
+        with self.lock:
+            return sorted(
+                route_number
+                for route_number, stages in self.done_stages.items()
+                if self.final_stage in stages
+            )
+
+    def get_failed_routes(self):
+        """Returns route numbers of routes which failed and were not completed
+        afterwards.
+
+        :returns: sorted list of route numbers
+        :rtype: list
+
+        """
+        with self.lock:
+            return sorted(self.failed_stages.keys())
+
+    def close(self):
+        """Closes manifest file."""
+        self.manifest_file.close()
@@ -1,27 +1,56 @@
 # -*- coding: utf-8 -*-
 import json
+import datetime as DT
+
+import numpy
 
-from shapely import wkt as shapely_wkt
 from shapely.geometry import LineString
-from osgeo import ogr
 
+from google_polyline_decoder import GooglePolylineDecoder
 from utility import Utility
 
 UTILITY = Utility()
+GOOGLE_POLYLINE_DECODER = GooglePolylineDecoder()
+
+# MapQuest shape format --> precision of compressed shape, None for raw.
+SHAPE_PRECISIONS = {
+    'raw': None,
+    'cmp': 5,
+    'cmp6': 6,
+}
 
 
 class MapQuest(object):
-    """This class handles mapquest route."""
+    """This class handles mapquest route.
+
+    :arg api_key: MapQuest api key
+    :type api_key: string
+
+    :arg shape_format: format of route shape in response, "raw" (list of
+        coordinates), "cmp" or "cmp6" (compressed string with 5 or 6 decimal
+        places). Compressed shape makes response much smaller.
+    :type shape_format: string
 
-    def __init__(self, api_key):
+    """
+
+    def __init__(self, api_key, shape_format='raw'):
+        if shape_format not in SHAPE_PRECISIONS:
+            raise ValueError(
+                'Unknown MapQuest shape format ' + shape_format + '.'
+            )
+
+        self.shape_format = shape_format
         self.base_url = (
             'http://open.mapquestapi.com/directions/v2/route'
         )
+        self.matrix_url = (
+            'http://open.mapquestapi.com/directions/v2/routematrix'
+        )
         self.api_key = api_key
 
     def get_route_data(self, start_coords, end_coords):
         """Executes function for making request to mapquest api and receives
-        route from mapquest. Converts route to shapely and ogr geometry,
+        route from mapquest. Converts route to shapely geometry,
         creates buffer around the route and extracts numerical attribute data
         like driving time and length.
 
@@ -45,7 +74,7 @@ class MapQuest(object):
             "routeType": "fastest",
             "timeType": 1,
             "enhancedNarrative": "false",
-            "shapeFormat": "raw",
+            "shapeFormat": self.shape_format,
             "generalize": 0,
             "locale": "en_US",
             "unit": "k",  # km
@@ -56,21 +85,16 @@ class MapQuest(object):
         route_data = UTILITY.make_service_request(
             base_url=self.base_url,
             key=self.api_key,
-            values=input_dict
+            values=input_dict,
+            provider='mapquest',
+            validate=self.is_valid_response
         )
 
         route_json = json.loads(route_data)
 
-        route_shapely, route_ogr = (
-            self.create_linestring(route_json=route_json)
-        )
+        route = self.create_linestring(route_json=route_json)
 
-        route_buffer_ogr = (
-            UTILITY.create_route_buffer(route=route_ogr)
-        )
-        route_buffer_shapely = shapely_wkt.loads(
-            route_buffer_ogr.ExportToWkt()
-        )
+        route_buffer = UTILITY.create_route_buffer(route=route)
 
         driving_time = {
             'sec': route_json['route']['time'],
@@ -78,45 +102,179 @@ class MapQuest(object):
         }
 
         return {
-            'route_ogr': route_ogr,
-            'route_shapely': route_shapely,
-            'route_buffer_ogr': route_buffer_ogr,
-            'route_buffer_shapely': route_buffer_shapely,
+            'route': route,
+            'route_buffer': route_buffer,
             'driving_time': driving_time,
             'len': route_json['route']['distance'],
         }
 
-    def create_linestring(self, route_json):
-        """Converts original mapquest route coordinates to more suitable format
-        for creating shapely and ogr geometry. Creates Shapely and Ogr
-        LineString geometries from route coordinates.
+    def get_matrix_data(self, origins, destinations):
+        """Gets driving time and length of routes from each origin to each
+        destination with one routeMatrix request. Route geometry is not
+        returned.
 
-        :arg route_json: dictionary with mapquest route data
-        :type route_json: dictionary
+        .. note:: One origin is sent as one-to-many matrix and one
+            destination as many-to-one matrix. Otherwise all locations are
+            sent as all-to-all matrix, which MapQuest allows for at most 25
+            locations.
+
+        :arg origins: list of strings with starting location coordinates,
+            e.g. ['45.5,15.5']
+        :type origins: list
+
+        :arg destinations: list of strings with ending location coordinates,
+            e.g. ['43.5,16.5', '44.5,16.0']
+        :type destinations: list
+
+        :returns: list with row for each origin, row is list with dictionary
+            of route attribute data for each destination
+        :rtype: list
+
+        """
+        origins = list(origins)
+        destinations = list(destinations)
+
+        if len(origins) == 1:
+            # Matrix from first location to all others.
+            locations = origins + destinations
+            options = {"allToAll": False, "manyToOne": False}
+        elif len(destinations) == 1:
+            # Matrix from all others to first location.
+            locations = destinations + origins
+            options = {"allToAll": False, "manyToOne": True}
+        else:
+            locations = origins + [
+                destination for destination in destinations
+                if destination not in origins
+            ]
+            options = {"allToAll": True, "manyToOne": False}
+
+        options.update({
+            "routeType": "fastest",
+            "unit": "k",  # km
+        })
+
+        # Matrix request is sent as JSON in "json" parameter.
+        input_dict = {
+            "json": json.dumps({
+                "locations": locations,
+                "options": options,
+            }),
+        }
+
+        matrix_data = UTILITY.make_service_request(
+            base_url=self.matrix_url,
+            key=self.api_key,
+            values=input_dict,
+            provider='mapquest',
+            validate=self.is_valid_response
+        )
+
+        matrix_json = json.loads(matrix_data)
+
+        if not self.is_valid_response(matrix_data):
+            raise ValueError(
+                'MapQuest responded with status code ' +
+                str(matrix_json.get('info', {}).get('statuscode')) + '.'
+            )
+
+        times = matrix_json['time']
+        distances = matrix_json['distance']
+
+        # First value of one-to-many and many-to-one matrix is route from
+        # first location to itself.
+        if len(origins) == 1:
+            return [[
+                self.create_matrix_route_data(times[index], distances[index])
+                for index in range(1, len(locations))
+            ]]
+
+        if len(destinations) == 1:
+            return [
+                [self.create_matrix_route_data(
+                    times[index], distances[index]
+                )]
+                for index in range(1, len(locations))
+            ]
 
-        :returns: tuple consisted of route's shapely and ogr geometry
-        :rtype: (shapely.geometry.linestring.LineString, osgeo.ogr.Geometry)
+        destination_indexes = [
+            locations.index(destination) for destination in destinations
+        ]
+
+        return [
+            [
+                self.create_matrix_route_data(
+                    times[origin_index][destination_index],
+                    distances[origin_index][destination_index]
+                )
+                for destination_index in destination_indexes
+            ]
+            for origin_index in range(len(origins))
+        ]
+
+    def create_matrix_route_data(self, time, distance):
+        """Creates route attribute data from routeMatrix values.
+
+        :arg time: driving time in seconds
+        :type time: integer
+
+        :arg distance: route length in kilometers
+        :type distance: float
+
+        :returns: dictionary with route attribute data
+        :rtype: dictionary
 
         """
-        # List of coordinates [x, y, x, y..., x, y]
-        coords_list = route_json['route']['shape']['shapePoints']
+        return {
+            'driving_time': {
+                'sec': time,
+                'hms': DT.timedelta(seconds=time)
+            },
+            'len': distance,
+        }
+
+    def is_valid_response(self, response_data):
+        """Checks if MapQuest found the route, so the response can be cached.
 
-        # Create list with points [[x, y], [x, y]...]
-        point_list = []
+        :arg response_data: mapquest response data
+        :type response_data: string
 
-        point_list = ([coords_list[x:x + 2] for x in range(
-            0, len(coords_list), 2)
-        ])
+        :returns: True if response status code is 0 (success)
+        :rtype: boolean
+
+        """
+        route_json = json.loads(response_data)
 
-        # Convert [[lat, lng], [lat, lng]..] TO [[lng, lat], [lng, lat]...]
-        for point in point_list:
-            point.reverse()
+        return route_json.get('info', {}).get('statuscode') == 0
+
+    def create_linestring(self, route_json):
+        """Converts original mapquest route coordinates to more suitable format
+        for creating shapely geometry. Creates Shapely LineString geometry
+        from route coordinates.
 
-        # Create shapely linestring from list of coordinate pairs.
-        route_linestring_shapely = LineString(point_list)
+        .. note:: Compressed shape is encoded with the same algorithm as
+            Google polyline, so it is decoded with GOOGLE_POLYLINE_DECODER.
+
+        :arg route_json: dictionary with mapquest route data
+        :type route_json: dictionary
+
+        :returns: route's shapely geometry
+        :rtype: shapely.geometry.LineString
+
+        """
+        shape_points = route_json['route']['shape']['shapePoints']
+        precision = SHAPE_PRECISIONS[self.shape_format]
 
-        # Create ogr linestring.
-        route_linestring_ogr = ogr.CreateGeometryFromWkb(
-            route_linestring_shapely.wkb)
+        if precision is None:
+            # Convert [lat, lng, lat, lng...] TO [[lng, lat], [lng, lat]...]
+            coords = numpy.asarray(
+                shape_points, dtype=float
+            ).reshape(-1, 2)[:, ::-1]
+        else:
+            coords = GOOGLE_POLYLINE_DECODER.decode_google_polyline(
+                point_str=shape_points,
+                precision=precision
+            )
 
-        return (route_linestring_shapely, route_linestring_ogr)
+        # Create shapely linestring from array of coordinate pairs.
+        return LineString(coords)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import collections
+import math
+
+
+class MatrixBatcher(object):
+    """This class groups location pairs of matrix mode into matrix requests.
+    Matrix request returns driving time and length from each of its origins
+    to each of its destinations, every origin-destination combination is
+    one element.
+
+    .. note:: Pairs are grouped greedily. Pairs with the same starting
+        location are sent as one-to-many request and pairs with the same
+        ending location as many-to-one request, each element of these
+        requests is a wanted pair. Pairs which share no location with other
+        pairs are packed into many-to-many requests of k pairs, which return
+        k * k elements for k wanted pairs, so packing is limited by
+        max_elements_per_pair.
+
+    :arg batch_size: maximum number of origins and of destinations in one
+        request, Google allows 25
+    :type batch_size: integer
+
+    :arg max_elements: maximum number of elements in one request, Google
+        allows 100
+    :type max_elements: integer
+
+    :arg max_elements_per_pair: maximum number of elements requested for
+        one pair when pairs without shared location are packed together.
+        If 1, each of those pairs is sent in separate request.
+    :type max_elements_per_pair: integer
+
+    :arg coordinate_precision: number of decimal places to which coordinates
+        are rounded when locations are compared, 5 is about 1 m
+    :type coordinate_precision: integer
+
+    """
+
+    def __init__(
+            self, batch_size=25, max_elements=100, max_elements_per_pair=1,
+            coordinate_precision=5):
+        self.batch_size = batch_size
+        self.max_elements = max_elements
+        self.max_elements_per_pair = max_elements_per_pair
+        self.coordinate_precision = coordinate_precision
+
+    def create_batches(self, jobs, buffer_size):
+        """Groups jobs to matrix request batches.
+
+        :arg jobs: iterable with jobs
+        :type jobs: iterable
+
+        :arg buffer_size: number of consecutive jobs which are grouped
+            together, so the whole locations file isn't held in memory
+        :type buffer_size: integer
+
+        :returns: generator of batches created by create_batch
+        :rtype: generator
+
+        """
+        buffered_jobs = []
+
+        for job in jobs:
+            buffered_jobs.append(job)
+
+            if len(buffered_jobs) < buffer_size:
+                continue
+
+            for batch in self.group_jobs(buffered_jobs):
+                yield batch
+
+            buffered_jobs = []
+
+        for batch in self.group_jobs(buffered_jobs):
+            yield batch
+
+    def group_jobs(self, jobs):
+        """Splits jobs to batches. Largest group of jobs with shared starting
+        or ending location is taken first, until no jobs share location.
+        Remaining jobs are packed together.
+
+        :arg jobs: list of jobs
+        :type jobs: list
+
+        :returns: list of batches
+        :rtype: list
+
+        """
+        group_size = min(self.batch_size, self.max_elements)
+        remaining_jobs = list(jobs)
+        batches = []
+
+        while remaining_jobs:
+            # Number of remaining jobs with each starting and ending location.
+            location_counts = collections.Counter(
+                (coords_name, self.get_location_key(job[coords_name]))
+                for job in remaining_jobs
+                for coords_name in ('start_coords', 'end_coords')
+            )
+
+            (coords_name, location_key), count = (
+                location_counts.most_common(1)[0]
+            )
+
+            if count < 2:
+                break
+
+            group = []
+            other_jobs = []
+
+            for job in remaining_jobs:
+                if self.get_location_key(job[coords_name]) == location_key:
+                    group.append(job)
+                else:
+                    other_jobs.append(job)
+
+            for index in range(0, len(group), group_size):
+                batches.append(
+                    self.create_batch(group[index:index + group_size])
+                )
+
+            remaining_jobs = other_jobs
+
+        # Remaining jobs don't share any location, k jobs packed together
+        # need k * k elements.
+        pack_size = max(1, min(
+            self.max_elements_per_pair,
+            self.batch_size,
+            int(math.sqrt(self.max_elements))
+        ))
+
+        for index in range(0, len(remaining_jobs), pack_size):
+            batches.append(
+                self.create_batch(remaining_jobs[index:index + pack_size])
+            )
+
+        return batches
+
+    def create_batch(self, jobs):
+        """Creates batch with distinct origins and destinations of jobs.
+
+        :arg jobs: list of jobs
+        :type jobs: list
+
+        :returns: dictionary with lists of 'origins' and 'destinations'
+            coordinates, 'origin_strings' and 'destination_strings' with
+            coordinates strings, 'jobs' and 'cells' with tuple (origin index,
+            destination index) for each job
+        :rtype: dictionary
+
+        """
+        batch = {
+            'origins': [],
+            'origin_strings': [],
+            'destinations': [],
+            'destination_strings': [],
+            'jobs': jobs,
+            'cells': [],
+        }
+
+        # Location key --> index in origins or destinations.
+        origin_indexes = {}
+        destination_indexes = {}
+
+        for job in jobs:
+            origin_key = self.get_location_key(job['start_coords'])
+            if origin_key not in origin_indexes:
+                origin_indexes[origin_key] = len(batch['origins'])
+                batch['origins'].append(job['start_coords'])
+                batch['origin_strings'].append(job['start_coords_string'])
+
+            destination_key = self.get_location_key(job['end_coords'])
+            if destination_key not in destination_indexes:
+                destination_indexes[destination_key] = len(
+                    batch['destinations']
+                )
+                batch['destinations'].append(job['end_coords'])
+                batch['destination_strings'].append(
+                    job['end_coords_string']
+                )
+
+            batch['cells'].append((
+                origin_indexes[origin_key],
+                destination_indexes[destination_key]
+            ))
+
+        return batch
+
+    def get_location_key(self, coords):
+        """Returns key of location with rounded coordinates, so the same
+        location written with different number of decimal places has the
+        same key.
+
+        :arg coords: dictionary with location coordinates,
+            e.g. {"x": 15.5, "y": 45.5}
+        :type coords: dictionary
+
+        :returns: tuple (x, y) of rounded coordinates
+        :rtype: tuple
+
+        """
+        return (
+            round(float(coords['x']), self.coordinate_precision),
+            round(float(coords['y']), self.coordinate_precision)
+        )
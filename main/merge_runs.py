@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+# Merges execution directories of sharded runs into one execution directory.
+# Usage: python merge_runs.py --output OUTPUT_DIR RUN_DIR [RUN_DIR...]
+
+import argparse
+import json
+import os
+import shutil
+
+from manifest import RunManifest
+from geometry_exporter import GeoPackageExporter
+
+
+class RunMerger(object):
+    """
+    RunMerger copies route directories of all provided executions to output
+    directory and combines their manifests, run_info.json summaries,
+    routes.gpkg and routes_encoded.jsonl files.
+
+    :arg run_dirs: list of execution directories, e.g. one for each shard
+    :type run_dirs: list
+
+    :arg output_dir: directory for merged execution, it must not exist
+    :type output_dir: string
+
+    """
+
+    def __init__(self, run_dirs, output_dir):
+        self.run_dirs = run_dirs
+        self.output_dir = output_dir
+
+        self.run()
+
+    def run(self):
+        """Creates output directory, merges route directories, manifests and
+        summaries of all executions.
+        """
+        os.mkdir(self.output_dir)
+
+        manifest = RunManifest(run_dir=self.output_dir)
+        exporter = None
+        shards = []
+
+        for run_dir in self.run_dirs:
+            self.merge_manifest(run_dir=run_dir, manifest=manifest)
+            self.copy_route_directories(run_dir=run_dir)
+            self.merge_encoded_routes(run_dir=run_dir)
+
+            geopackage_filename = os.path.join(run_dir, 'routes.gpkg')
+            if os.path.exists(geopackage_filename):
+                if exporter is None:
+                    exporter = GeoPackageExporter(
+                        filename=os.path.join(self.output_dir, 'routes.gpkg')
+                    )
+
+                exporter.append_file(geopackage_filename)
+
+            run_info_filename = os.path.join(run_dir, 'run_info.json')
+            if os.path.exists(run_info_filename):
+                with open(run_info_filename, 'r') as info_file:
+                    shards.append(json.load(info_file).get('shard'))
+
+        if exporter is not None:
+            exporter.close()
+
+        self.check_shards(shards)
+
+        run_info = {
+            'shards': shards,
+            'completed_routes': len(manifest.get_completed_routes()),
+            'failed_routes': manifest.get_failed_routes(),
+        }
+
+        run_info_filename = os.path.join(self.output_dir, 'run_info.json')
+        with open(run_info_filename, 'w') as info_file:
+            json.dump(run_info, info_file, indent=4)
+
+        manifest.close()
+
+    def merge_manifest(self, run_dir, manifest):
+        """Appends records from execution manifest to merged manifest.
+
+        :arg run_dir: execution directory
+        :type run_dir: string
+
+        :arg manifest: merged manifest
+        :type manifest: manifest.RunManifest
+
+        """
+        manifest_filename = os.path.join(run_dir, 'manifest.jsonl')
+
+        if not os.path.exists(manifest_filename):
+            print 'No manifest in ' + run_dir + '.'
+            return
+
+        with open(manifest_filename, 'r') as manifest_file:
+            for line in manifest_file:
+                # Skip incomplete record of killed execution.
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+
+                manifest.write_record(record)
+
+    def merge_encoded_routes(self, run_dir):
+        """Appends records from routes_encoded.jsonl file of execution to
+        merged file.
+
+        :arg run_dir: execution directory
+        :type run_dir: string
+
+        """
+        source_filename = os.path.join(run_dir, 'routes_encoded.jsonl')
+
+        if not os.path.exists(source_filename):
+            return
+
+        target_filename = os.path.join(self.output_dir, 'routes_encoded.jsonl')
+
+        with open(source_filename, 'r') as source_file:
+            with open(target_filename, 'a') as target_file:
+                for line in source_file:
+                    # Skip incomplete record of killed execution.
+                    try:
+                        json.loads(line)
+                    except ValueError:
+                        continue
+
+                    target_file.write(line.rstrip('\n') + '\n')
+
+    def copy_route_directories(self, run_dir):
+        """Copies route directories from execution directory to output
+        directory.
+
+        .. note:: Route numbers are global for the whole locations file, so
+            route directories of different shards don't overlap. If the same
+            route exists in more executions, first one is kept.
+
+        :arg run_dir: execution directory
+        :type run_dir: string
+
+        """
+        for name in sorted(os.listdir(run_dir)):
+            source = os.path.join(run_dir, name)
+
+            if not name.startswith('route_') or not os.path.isdir(source):
+                continue
+
+            target = os.path.join(self.output_dir, name)
+
+            if os.path.exists(target):
+                print 'Skipping ' + source + ', ' + name + ' already merged.'
+                continue
+
+            shutil.copytree(source, target)
+
+    def check_shards(self, shards):
+        """Prints warning if some shard of sharded execution is missing.
+
+        :arg shards: list of shard strings from run_info.json, e.g. ['0/2']
+        :type shards: list
+
+        """
+        shard_counts = set()
+        shard_indexes = set()
+
+        for shard in shards:
+            if shard:
+                index, count = shard.split('/')
+                shard_indexes.add(int(index))
+                shard_counts.add(int(count))
+
+        if len(shard_counts) > 1:
+            print 'Merged executions have different number of shards.'
+        elif shard_counts:
+            count = shard_counts.pop()
+            missing = set(range(count)) - shard_indexes
+
+            if missing:
+                print (
+                    'Missing shards: ' +
+                    ', '.join(
+                        str(index) + '/' + str(count)
+                        for index in sorted(missing)
+                    ) + '.'
+                )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Merge execution directories of sharded runs.'
+    )
+    parser.add_argument(
+        'run_dirs',
+        metavar='RUN_DIR',
+        nargs='+',
+        help='execution directory of one shard'
+    )
+    parser.add_argument(
+        '--output',
+        required=True,
+        help='directory for merged execution'
+    )
+    args = parser.parse_args()
+
+    RunMerger(run_dirs=args.run_dirs, output_dir=args.output)
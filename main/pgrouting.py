@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
+import contextlib
 import datetime as DT
+import json
 
-from shapely import wkt as shapely_wkt
-from osgeo import ogr
+import psycopg2
+
+from shapely import ops as shapely_ops
+from shapely import wkb as shapely_wkb
+from shapely.geometry import MultiLineString
 
 from utility import Utility
 
@@ -12,18 +17,189 @@ UTILITY = Utility()
 class PgRouting(object):
     """This class handles pgrouting route.
 
-    :arg cursor: psycopg cursor
-    :type cursor: psycopg2._psycopg.cursor
+    .. note:: Each call borrows connection from pool, so routes can be
+        queried from many threads at the same time. Queries are prepared
+        once on each connection and executed with bound parameters.
+
+    :arg connection_pool: pool of psycopg connections, its size limits
+        number of queries running at the same time
+    :type connection_pool: psycopg2.pool.ThreadedConnectionPool
+
+    :arg merge_parts: if True, connected route segments are merged to
+        LineString, otherwise each segment is separate part of
+        MultiLineString
+    :type merge_parts: boolean
+
+    :arg bbox_margin: margin in degrees around bounding box of starting and
+        ending location. Only edges and restrictions inside the box are
+        loaded for routing. If 0, the whole graph is used.
+    :type bbox_margin: float
+
+    :arg bbox_attempts: number of attempts with growing box, margin is
+        doubled after each attempt where route isn't found. When all
+        attempts fail, the whole graph is used.
+    :type bbox_attempts: integer
+
+    :arg prepared_costs: if True, costs are read from cost_time and
+        reverse_cost_time columns created by prepare_graph.py, otherwise
+        they are computed in each query
+    :type prepared_costs: boolean
+
+    :arg aggregate_route: if True, route cost, length and geometry are
+        aggregated in database and query returns one row with route
+        geometry as WKB, otherwise it returns row for each route segment
+    :type aggregate_route: boolean
 
     """
 
-    def __init__(self, cursor):
-        self.cursor = cursor
+    def __init__(self, connection_pool, merge_parts=False, bbox_margin=0,
+                 bbox_attempts=3, prepared_costs=False,
+                 aggregate_route=False):
+        self.connection_pool = connection_pool
+        self.merge_parts = merge_parts
+        self.bbox_margin = bbox_margin
+        self.bbox_attempts = bbox_attempts
+        self.prepared_costs = prepared_costs
+        self.aggregate_route = aggregate_route
+
+        self.statements = self.create_statements()
+
+        # Set of (connection, statement name) already prepared.
+        self.prepared_statements = set()
+
+    @contextlib.contextmanager
+    def get_cursor(self):
+        """Borrows connection from pool and provides its cursor. Transaction
+        is committed when block finishes or rolled back when it raises an
+        exception, so connection goes back to pool without open transaction.
+
+        :returns: context manager with psycopg cursor
+        :rtype: contextlib.GeneratorContextManager
+
+        """
+        connection = self.connection_pool.getconn()
+
+        try:
+            cursor = connection.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+            connection.commit()
+        except Exception:
+            if not connection.closed:
+                connection.rollback()
+            raise
+        finally:
+            self.connection_pool.putconn(connection)
+
+    def execute_statement(self, cursor, name, parameters):
+        """Executes prepared statement with bound parameters. Statement is
+        prepared on first use on each connection.
+
+        .. note:: Prepared statement lasts until connection is closed, so it
+            is parsed only once for each pooled connection. Statements are
+            prepared only when they are used, so matrix statement doesn't
+            fail on pgrouting versions without many-to-many Dijkstra.
+
+        :arg cursor: psycopg cursor of borrowed connection
+        :type cursor: psycopg2._psycopg.cursor
+
+        :arg name: statement name, e.g. 'pgrouting_route'
+        :type name: string
+
+        :arg parameters: statement parameters
+        :type parameters: tuple
+
+        """
+        if (cursor.connection, name) not in self.prepared_statements:
+            parameter_types, query = self.statements[name]
+            cursor.execute(
+                'PREPARE ' + name + ' (' + parameter_types + ') AS ' + query
+            )
+            self.prepared_statements.add((cursor.connection, name))
+
+        cursor.execute(
+            'EXECUTE ' + name + ' (' + ', '.join(['%s'] * len(parameters)) +
+            ');',
+            parameters
+        )
+
+    def create_statements(self):
+        """Creates queries which are prepared on connections.
+
+        .. note:: Edges and restrictions queries are executed by pgrouting,
+            so they are passed to prepared statements as text parameters.
+
+        :returns: dictionary statement name --> (parameter types, query)
+        :rtype: dictionary
+
+        """
+        # Locations are unnested from two arrays and each one looks up its
+        # nearest vertex in lateral subquery.
+        vertices_query = """
+            SELECT vertex.id
+            FROM unnest($1, $2) WITH ORDINALITY AS location(lon, lat, ordinal)
+            CROSS JOIN LATERAL (
+                SELECT id
+                FROM ways_vertices_pgr
+                WHERE the_geom IS NOT NULL
+                ORDER BY the_geom <->
+                    ST_SetSRID(ST_MakePoint(location.lon, location.lat), 4326)
+                LIMIT 1
+            ) AS vertex
+            ORDER BY location.ordinal
+        """
+
+        if self.aggregate_route:
+            # Segments are collected in route order. HAVING returns no row
+            # when route isn't found, the same as query for segments.
+            route_geom = 'ST_Collect(ways.the_geom ORDER BY route.seq)'
+
+            if self.merge_parts:
+                route_geom = 'ST_LineMerge(' + route_geom + ')'
+
+            route_query = """
+                SELECT SUM(route.cost) AS cost, SUM(ways.length) AS length,
+                ST_AsBinary(""" + route_geom + """) AS the_geom
+                FROM ways JOIN (
+                    SELECT seq, id1 AS node, id2 AS edge, cost
+                    FROM pgr_trsp($1, $2, $3, true, true, $4)
+                ) as route ON ways.gid = route.edge
+                HAVING COUNT(*) > 0
+            """
+        else:
+            route_query = """
+                SELECT gid, ST_AsGeoJSON(the_geom) as the_geom, cost, length
+                FROM ways JOIN (
+                    SELECT seq, id1 AS node, id2 AS edge, cost
+                    FROM pgr_trsp($1, $2, $3, true, true, $4)
+                ) as route ON ways.gid = route.edge
+                ORDER BY route.seq
+            """
+
+        # Cost and length are summed for each start and end vertex.
+        matrix_query = """
+            SELECT route.start_vid, route.end_vid,
+            SUM(route.cost), SUM(ways.length)
+            FROM pgr_dijkstra($1, $2, $3, true) AS route
+            JOIN ways ON ways.gid = route.edge
+            GROUP BY route.start_vid, route.end_vid
+        """
+
+        return {
+            'pgrouting_vertices': ('float8[], float8[]', vertices_query),
+            'pgrouting_route': ('text, integer, integer, text', route_query),
+            'pgrouting_matrix': ('text, bigint[], bigint[]', matrix_query),
+        }
 
-    def get_route_data(self, start_coords, end_coords):
+    def get_route_data(
+            self, start_coords, end_coords,
+            start_vertex_id=None, end_vertex_id=None):
         """Executes function for getting pgrouting ways vertices from provided
         coordinates, executes function for getting route with pgrouting.
-        Converts route to shapely and ogr geometry, creates buffer around the
+        Converts route to shapely geometry, creates buffer around the
         route and executes function for calculating numerical attribute data
         like driving time and length.
 
@@ -35,30 +211,48 @@ class PgRouting(object):
             e.g. {"x": 15.5, "y": 45.5}
         :type end_coords: dictionary
 
+        :arg start_vertex_id: way vertex id nearest to starting location, if
+            it is already known, e.g. from get_way_vertices
+        :type start_vertex_id: integer
+
+        :arg end_vertex_id: way vertex id nearest to ending location, if it
+            is already known
+        :type end_vertex_id: integer
+
         :returns: dictionary with pgrouting route data
         :rtype: dictionary
 
         """
-        start_vertex_id, end_vertex_id = self.get_way_vertices_from_coords(
-            start_coords=start_coords,
-            end_coords=end_coords
-        )
-
-        raw_route, colnames = self.get_route_from_pgrouting(
-            start_vertex_id=start_vertex_id,
-            end_vertex_id=end_vertex_id
-        )
-
-        route_ogr = self.create_multiline_from_linesegments(
-            raw_route=raw_route,
-            colnames=colnames
-        )
-        route_shapely = shapely_wkt.loads(route_ogr.ExportToWkt())
-
-        route_buffer_ogr = UTILITY.create_route_buffer(route=route_ogr)
-        route_buffer_shapely = shapely_wkt.loads(
-            route_buffer_ogr.ExportToWkt()
-        )
+        with self.get_cursor() as cursor:
+            if start_vertex_id is None or end_vertex_id is None:
+                start_vertex_id, end_vertex_id = (
+                    self.get_way_vertices_from_coords(
+                        cursor=cursor,
+                        start_coords=start_coords,
+                        end_coords=end_coords
+                    )
+                )
+
+            raw_route, colnames = self.get_route_from_pgrouting(
+                cursor=cursor,
+                start_vertex_id=start_vertex_id,
+                end_vertex_id=end_vertex_id,
+                start_coords=start_coords,
+                end_coords=end_coords
+            )
+
+        if self.aggregate_route:
+            route = self.create_route_from_wkb(
+                raw_route=raw_route,
+                colnames=colnames
+            )
+        else:
+            route = self.create_multiline_from_linesegments(
+                raw_route=raw_route,
+                colnames=colnames
+            )
+
+        route_buffer = UTILITY.create_route_buffer(route=route)
 
         driving_time = self.sum_cost(
             raw_route=raw_route,
@@ -71,17 +265,18 @@ class PgRouting(object):
         )
 
         return {
-            'route_ogr': route_ogr,
-            'route_shapely': route_shapely,
-            'route_buffer_ogr': route_buffer_ogr,
-            'route_buffer_shapely': route_buffer_shapely,
+            'route': route,
+            'route_buffer': route_buffer,
             'driving_time': driving_time,
             'len': route_length,
         }
 
-    def get_way_vertices_from_coords(self, start_coords, end_coords):
+    def get_way_vertices_from_coords(self, cursor, start_coords, end_coords):
         """Gets nearest OSM way vertex for starting and ending location.
 
+        :arg cursor: psycopg cursor of borrowed connection
+        :type cursor: psycopg2._psycopg.cursor
+
         :arg start_coords: dictionary with route starting location coordinates,
             e.g. {"x": 15.5, "y": 45.5}
         :type start_coords: dictionary
@@ -95,40 +290,56 @@ class PgRouting(object):
         :rtype: tuple
 
         """
+        return tuple(self.query_way_vertices(
+            cursor=cursor,
+            coords_list=[start_coords, end_coords]
+        ))
+
+    def get_way_vertices(self, coords_list):
+        """Gets nearest OSM way vertex for each location with one query.
+
+        :arg coords_list: list of dictionaries with location coordinates,
+            e.g. [{"x": 15.5, "y": 45.5}, {"x": 16.5, "y": 43.5}]
+        :type coords_list: list
+
+        :returns: list of OSM way vertex ids nearest to locations, in the
+            same order as locations
+        :rtype: list
 
-        # Compose query for finding nearest vertex to location.
-        sql_query_template = """
-            SELECT id,
-            ST_Distance(
-                ST_GeomFromText('POINT({lon} {lat})',4326),
-                the_geom
-            ) AS distance
-            FROM ways_vertices_pgr
-            WHERE the_geom IS NOT NULL
-            ORDER BY distance ASC LIMIT 1;
         """
+        with self.get_cursor() as cursor:
+            return self.query_way_vertices(
+                cursor=cursor,
+                coords_list=coords_list
+            )
 
-        # Execute query for start coord.
-        sql_query = sql_query_template.format(
-            lon=start_coords['x'],
-            lat=start_coords['y']
-        )
+    def query_way_vertices(self, cursor, coords_list):
+        """Executes prepared query for nearest OSM way vertices.
 
-        self.cursor.execute(sql_query)
-        start_vertex = self.cursor.fetchone()
+        .. note:: Nearest vertex is found with KNN operator <->, which uses
+            GiST index on ways_vertices_pgr.the_geom (created by
+            prepare_graph.py), so vertices table is not scanned.
 
-        # Execute query for end coord.
-        sql_query = sql_query_template.format(
-            lon=end_coords['x'],
-            lat=end_coords['y']
-        )
+        :arg cursor: psycopg cursor of borrowed connection
+        :type cursor: psycopg2._psycopg.cursor
+
+        :arg coords_list: list of dictionaries with location coordinates
+        :type coords_list: list
+
+        :returns: list of OSM way vertex ids nearest to locations
+        :rtype: list
 
-        self.cursor.execute(sql_query)
-        end_vertex = self.cursor.fetchone()
+        """
+        self.execute_statement(cursor, 'pgrouting_vertices', (
+            [float(coords['x']) for coords in coords_list],
+            [float(coords['y']) for coords in coords_list],
+        ))
 
-        return (start_vertex[0], end_vertex[0])
+        return [row[0] for row in cursor.fetchall()]
 
-    def get_route_from_pgrouting(self, start_vertex_id, end_vertex_id):
+    def get_route_from_pgrouting(
+            self, cursor, start_vertex_id, end_vertex_id,
+            start_coords=None, end_coords=None):
         """Gets route from OSM data in databse with pgrouting function.
 
         .. note:: Uses pgrouting Turn Restriction Shortest Path function.
@@ -137,41 +348,228 @@ class PgRouting(object):
             rule, to_cost, maxspeed_forward, maxspeed_backward, osm_id,
             priority, the_geom, source, target, seq, node, edge, cost.
 
+        .. note:: If aggregate_route is set, query returns only one row with
+            summed cost and length and route geometry as WKB.
+
+        .. note:: If bbox_margin is set and locations are provided, graph is
+            limited to box around locations. Route which leaves the box
+            can't be found, so box grows until route is found. Each attempt
+            runs in savepoint, so failed pgrouting query doesn't abort the
+            transaction.
+
+        :arg cursor: psycopg cursor of borrowed connection
+        :type cursor: psycopg2._psycopg.cursor
+
+        :arg start_vertex_id: way vertex id from which route starts
+        :type start_vertex_id: integer
+
+        :arg end_vertex_id: way vertex id where route ends
+        :type end_vertex_id: integer
+
+        :arg start_coords: dictionary with route starting location
+            coordinates, e.g. {"x": 15.5, "y": 45.5}
+        :type start_coords: dictionary
+
+        :arg end_coords: dictionary with route ending location coordinates,
+            e.g. {"x": 16.5, "y": 43.5}
+        :type end_coords: dictionary
+
+        :returns: tuple consisted of raw route data and list of column names.
+        :rtype: (list, list)
+
+        """
+        if self.bbox_margin and start_coords and end_coords:
+            min_x = min(start_coords['x'], end_coords['x'])
+            min_y = min(start_coords['y'], end_coords['y'])
+            max_x = max(start_coords['x'], end_coords['x'])
+            max_y = max(start_coords['y'], end_coords['y'])
+
+            margin = self.bbox_margin
+
+            for attempt in range(self.bbox_attempts):
+                bbox = (
+                    min_x - margin, min_y - margin,
+                    max_x + margin, max_y + margin
+                )
+
+                cursor.execute('SAVEPOINT pgrouting_bbox;')
+
+                try:
+                    route, colnames = self.execute_route_query(
+                        cursor=cursor,
+                        start_vertex_id=start_vertex_id,
+                        end_vertex_id=end_vertex_id,
+                        bbox=bbox
+                    )
+                except psycopg2.Error:
+                    # Older pgrouting raises error when path isn't found.
+                    cursor.execute('ROLLBACK TO SAVEPOINT pgrouting_bbox;')
+                    route = []
+                else:
+                    cursor.execute('RELEASE SAVEPOINT pgrouting_bbox;')
+
+                if route:
+                    return (route, colnames)
+
+                margin *= 2
+
+        return self.execute_route_query(
+            cursor=cursor,
+            start_vertex_id=start_vertex_id,
+            end_vertex_id=end_vertex_id
+        )
+
+    def execute_route_query(
+            self, cursor, start_vertex_id, end_vertex_id, bbox=None):
+        """Executes prepared pgrouting query for route.
+
+        :arg cursor: psycopg cursor of borrowed connection
+        :type cursor: psycopg2._psycopg.cursor
+
         :arg start_vertex_id: way vertex id from which route starts
         :type start_vertex_id: integer
 
         :arg end_vertex_id: way vertex id where route ends
         :type end_vertex_id: integer
 
+        :arg bbox: tuple (min x, min y, max x, max y) which limits edges and
+            restrictions, None for the whole graph
+        :type bbox: tuple
+
         :returns: tuple consisted of raw route data and list of column names.
         :rtype: (list, list)
 
         """
-        # Compose query for getting the best route with pgrouting.
-        sql_query = """
-            SELECT gid, ST_AsGeoJSON(the_geom) as the_geom, cost, length
-            FROM ways JOIN (
-                SELECT seq, id1 AS node, id2 AS edge, cost
-                FROM pgr_trsp('SELECT gid AS id, source, target,
-                    length / (maxspeed_forward) AS cost,
-                    reverse_cost / (maxspeed_forward) AS reverse_cost
-                    FROM ways', {start_id}, {end_id}, true, true,
-                    'SELECT to_cost, to_edge AS target_id,
-                    from_edge || coalesce('','' || via, '''') AS via_path
-                    FROM restrictions WHERE
-                    from_edge IS NOT NULL AND to_edge IS NOT NULL')
-            ) as route ON ways.gid = route.edge;
-        """.format(start_id=start_vertex_id, end_id=end_vertex_id)
-
-        self.cursor.execute(sql_query)
+        # Queries for edges and restrictions are executed by pgrouting.
+        edges_query = self.get_edges_query()
+        restrictions_query = """
+            SELECT to_cost, to_edge AS target_id,
+            from_edge || coalesce(',' || via, '') AS via_path
+            FROM restrictions WHERE
+            from_edge IS NOT NULL AND to_edge IS NOT NULL
+        """
+
+        if bbox is not None:
+            envelope = 'ST_MakeEnvelope({0}, {1}, {2}, {3}, 4326)'.format(
+                *[float(value) for value in bbox]
+            )
+
+            edges_query += ' WHERE the_geom && ' + envelope
+            restrictions_query += (
+                ' AND to_edge IN (SELECT gid FROM ways WHERE the_geom && ' +
+                envelope + ')'
+            )
+
+        self.execute_statement(cursor, 'pgrouting_route', (
+            edges_query, start_vertex_id, end_vertex_id, restrictions_query
+        ))
 
         # Get route data.
-        route = self.cursor.fetchall()
+        route = cursor.fetchall()
         # Get column names.
-        colnames = [desc[0] for desc in self.cursor.description]
+        colnames = [desc[0] for desc in cursor.description]
 
         return (route, colnames)
 
+    def get_matrix_data(self, origins, destinations):
+        """Gets driving time and length of routes from each origin to each
+        destination with one pgrouting query. Route geometry is not
+        returned.
+
+        .. note:: Uses pgrouting many-to-many Dijkstra function (pgrouting
+            2.1 or newer), which doesn't support turn restrictions, so
+            routes may differ from routes found with get_route_data.
+
+        :arg origins: list of dictionaries with starting location
+            coordinates, e.g. [{"x": 15.5, "y": 45.5}]
+        :type origins: list
+
+        :arg destinations: list of dictionaries with ending location
+            coordinates, e.g. [{"x": 16.5, "y": 43.5}]
+        :type destinations: list
+
+        :returns: list with row for each origin, row is list with dictionary
+            of route attribute data for each destination, or None if route
+            wasn't found
+        :rtype: list
+
+        """
+        origins = list(origins)
+
+        with self.get_cursor() as cursor:
+            # All locations are snapped with one query.
+            vertex_ids = self.query_way_vertices(
+                cursor=cursor,
+                coords_list=origins + list(destinations)
+            )
+            start_vertex_ids = vertex_ids[:len(origins)]
+            end_vertex_ids = vertex_ids[len(origins):]
+
+            self.execute_statement(cursor, 'pgrouting_matrix', (
+                self.get_edges_query(), start_vertex_ids, end_vertex_ids
+            ))
+
+            # Dictionary (start vertex id, end vertex id) --> (cost, length).
+            totals = dict(
+                ((start_vertex_id, end_vertex_id), (cost, length))
+                for start_vertex_id, end_vertex_id, cost, length
+                in cursor.fetchall()
+            )
+
+        return [
+            [
+                self.create_matrix_route_data(
+                    totals=totals.get((start_vertex_id, end_vertex_id))
+                )
+                for end_vertex_id in end_vertex_ids
+            ]
+            for start_vertex_id in start_vertex_ids
+        ]
+
+    def create_matrix_route_data(self, totals):
+        """Creates route attribute data from summed route cost and length.
+
+        :arg totals: tuple (cost, length), None if route wasn't found
+        :type totals: tuple
+
+        :returns: dictionary with route attribute data, or None if route
+            wasn't found
+        :rtype: dictionary
+
+        """
+        if totals is None:
+            return None
+
+        cost, length = totals
+
+        return {
+            'driving_time': self.convert_cost(cost=cost),
+            'len': length,
+        }
+
+    def get_edges_query(self):
+        """Returns query for graph edges, which is executed by pgrouting.
+
+        :returns: edges query with id, source, target, cost and reverse_cost
+            columns, cost is driving time in hours
+        :rtype: string
+
+        """
+        if self.prepared_costs:
+            return """
+                SELECT gid AS id, source, target,
+                cost_time AS cost,
+                reverse_cost_time AS reverse_cost
+                FROM ways
+            """
+
+        return """
+            SELECT gid AS id, source, target,
+            length / (maxspeed_forward) AS cost,
+            reverse_cost / (maxspeed_forward) AS reverse_cost
+            FROM ways
+        """
+
     def sum_cost(self, raw_route, colnames):
         """Calculates overall route cost.
 
@@ -187,11 +585,25 @@ class PgRouting(object):
         :rtype: dictionary
 
         """
+        cost_index = colnames.index('cost')
+
         cost = 0
         # For each segement in raw_route increase cost.
         for segment in raw_route:
-            cost += segment[colnames.index('cost')]
+            cost += segment[cost_index]
 
+        return self.convert_cost(cost=cost)
+
+    def convert_cost(self, cost):
+        """Converts route cost to driving time.
+
+        :arg cost: route cost in decimal hours
+        :type cost: float
+
+        :returns: dictionary with driving time in seconds and in HMS fomat.
+        :rtype: dictionary
+
+        """
         # Convert cost from decimal hours to h:m:s and seconds format.
         time_hms = DT.timedelta(seconds=cost * 60 * 60.0)
         time_sec = cost * 3600
@@ -215,17 +627,26 @@ class PgRouting(object):
         :rtype: float
 
         """
+        length_index = colnames.index('length')
+
         length = 0
 
         for segment in raw_route:
-            length += segment[colnames.index('length')]
+            length += segment[length_index]
 
         return length
 
     def create_multiline_from_linesegments(self, raw_route, colnames):
-        """Creates multiline ogr geometry from raw pgrouting route.
+        """Creates multiline shapely geometry from raw pgrouting route.
 
         .. note:: Raw pgrouting route consists of separate line segments.
+            Segment geometry is GeoJson LineString, so its coordinates are
+            used directly.
+
+        .. note:: When merge_parts is set, segments are merged with
+            shapely linemerge, which joins segments at shared end points
+            regardless of their direction. Result is MultiLineString only
+            if route is not connected.
 
         :arg raw_route: raw route data retreived from db with pgrouting
         :type raw_route: list
@@ -233,15 +654,50 @@ class PgRouting(object):
         :arg colnames: list of column names retreived from db with pgrouting
         :type colnames: list
 
-        :returns: ogr multiline geometry representing route
-        :rtype: osgeo.ogr.Geometry
+        :returns: shapely geometry representing route
+        :rtype: shapely.geometry.MultiLineString or
+            shapely.geometry.LineString
 
         """
-        multiline = ogr.Geometry(ogr.wkbMultiLineString)
+        geom_index = colnames.index('the_geom')
 
-        for segment in raw_route:
-            the_geom = segment[colnames.index('the_geom')]
-            line = ogr.CreateGeometryFromJson(the_geom)
-            multiline.AddGeometry(line)
+        lines = [
+            json.loads(segment[geom_index])['coordinates']
+            for segment in raw_route
+        ]
+
+        route = MultiLineString(lines)
+
+        if self.merge_parts:
+            route = shapely_ops.linemerge(route)
+
+        return route
+
+    def create_route_from_wkb(self, raw_route, colnames):
+        """Creates shapely geometry from route aggregated in database.
+
+        .. note:: Route geometry is collected from segments in database and
+            returned as WKB, so it is loaded with one call. When merge_parts
+            is set, segments are merged with ST_LineMerge.
+
+        :arg raw_route: list with aggregated route row retreived from db with
+            pgrouting, empty if route wasn't found
+        :type raw_route: list
+
+        :arg colnames: list of column names retreived from db with pgrouting
+        :type colnames: list
+
+        :returns: shapely geometry representing route
+        :rtype: shapely.geometry.MultiLineString or
+            shapely.geometry.LineString
+
+        """
+        # Query returns no row when route isn't found. Route is empty, the
+        # same as route created from no line segments.
+        if not raw_route:
+            return MultiLineString()
+
+        geom_index = colnames.index('the_geom')
 
-        return multiline
+        # Psycopg returns bytea as buffer.
+        return shapely_wkb.loads(bytes(raw_route[0][geom_index]))
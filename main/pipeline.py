@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+import sys
+import threading
+import traceback
+import Queue
+
+# Marker put in stage queue to tell stage worker that there are no more jobs.
+STOP = object()
+
+
+class Pipeline(object):
+    """This class runs jobs through a chain of stages. Every stage has its
+    own worker threads and stages are connected with bounded queues, so
+    slow stage makes previous stages wait instead of filling the memory.
+
+    :arg stages: list of dictionaries which describe stages in order of
+        execution, e.g. [{'name': 'database', 'function': f, 'workers': 2}].
+        Stage function receives a job and returns a job for next stage.
+        If function returns None job is dropped. Stage can also have
+        'batch_function' and 'batch_size', then worker takes up to
+        batch_size waiting jobs and batch function receives list of jobs and
+        returns list of (job, exc_info) tuples, one for each job, where
+        exc_info is None if job succeeded. Failed jobs are reported with
+        on_error and dropped. If batch function itself raises, the error is
+        reported with on_error for each job of the batch and jobs are
+        processed again one by one with stage function.
+    :type stages: list
+
+    :arg queue_size: maximum number of jobs waiting in front of each stage
+    :type queue_size: integer
+
+    :arg on_error: function called with stage name, job and exc_info when
+        job fails in stage function or batch function. If not set,
+        traceback is printed.
+    :type on_error: function
+
+    :arg on_complete: function called with stage name and job when stage
+        function finishes successfully
+    :type on_complete: function
+
+    """
+
+    def __init__(self, stages, queue_size, on_error=None, on_complete=None):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_error = on_error or self.print_error
+        self.on_complete = on_complete
+
+    def run(self, jobs):
+        """Starts workers for all stages, puts jobs into the first stage and
+        waits until all jobs pass through the pipeline.
+
+        .. note:: Stages are stopped in order. When all workers of a stage
+            finish, workers of next stage get the stop marker.
+
+        :arg jobs: iterable with jobs
+        :type jobs: iterable
+
+        """
+        # Create input queue for each stage.
+        queues = [
+            Queue.Queue(maxsize=self.queue_size) for stage in self.stages
+        ]
+
+        # Start stage workers. Last stage has no output queue.
+        stage_threads = []
+        for index, stage in enumerate(self.stages):
+            if index + 1 < len(queues):
+                output_queue = queues[index + 1]
+            else:
+                output_queue = None
+
+            threads = []
+            for worker_number in range(stage['workers']):
+                thread = threading.Thread(
+                    target=self.work,
+                    name=stage['name'] + '_' + str(worker_number),
+                    args=(stage, queues[index], output_queue)
+                )
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+            stage_threads.append(threads)
+
+        # Feed the first stage. Put blocks while the queue is full.
+        for job in jobs:
+            queues[0].put(job)
+
+        # Stop stages one after another.
+        for index, threads in enumerate(stage_threads):
+            for thread in threads:
+                queues[index].put(STOP)
+
+            for thread in threads:
+                thread.join()
+
+    def work(self, stage, input_queue, output_queue):
+        """Stage worker loop. Takes job from input queue, executes stage
+        function and puts result to output queue.
+
+        :arg stage: dictionary describing the stage
+        :type stage: dictionary
+
+        :arg input_queue: queue with jobs for this stage
+        :type input_queue: Queue.Queue
+
+        :arg output_queue: queue with jobs for next stage, None for last stage
+        :type output_queue: Queue.Queue
+
+        """
+        batch_size = stage.get('batch_size', 1)
+        stopped = False
+
+        while not stopped:
+            jobs = [input_queue.get()]
+
+            # Take more jobs which are already waiting, without blocking.
+            while len(jobs) < batch_size and jobs[-1] is not STOP:
+                try:
+                    jobs.append(input_queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+            if jobs[-1] is STOP:
+                jobs.pop()
+                stopped = True
+
+            if not jobs:
+                continue
+
+            if len(jobs) > 1 and 'batch_function' in stage:
+                results = self.execute_batch(stage, jobs)
+            else:
+                results = [self.execute(stage, job) for job in jobs]
+
+            for job in results:
+                if job is not None and self.on_complete is not None:
+                    self.on_complete(stage['name'], job)
+
+                if job is not None and output_queue is not None:
+                    output_queue.put(job)
+
+    def execute_batch(self, stage, jobs):
+        """Executes stage batch function for many jobs. Jobs which failed in
+        batch are reported and dropped. If batch function raises, jobs are
+        executed again one by one with stage function.
+
+        :arg stage: dictionary describing the stage
+        :type stage: dictionary
+
+        :arg jobs: list of jobs for this stage
+        :type jobs: list
+
+        :returns: list with job for next stage or None for each job
+        :rtype: list
+
+        """
+        try:
+            batch_results = stage['batch_function'](jobs)
+        except Exception:
+            exc_info = sys.exc_info()
+            for job in jobs:
+                self.on_error(stage['name'], job, exc_info)
+
+            return [self.execute(stage, job) for job in jobs]
+
+        results = []
+
+        for job, exc_info in batch_results:
+            if exc_info is not None:
+                self.on_error(stage['name'], job, exc_info)
+                job = None
+
+            results.append(job)
+
+        return results
+
+    def execute(self, stage, job):
+        """Executes stage function for one job.
+
+        :arg stage: dictionary describing the stage
+        :type stage: dictionary
+
+        :arg job: job for this stage
+        :type job: object
+
+        :returns: job for next stage or None if job failed or was dropped
+        :rtype: object
+
+        """
+        try:
+            return stage['function'](job)
+        except Exception:
+            self.on_error(stage['name'], job, sys.exc_info())
+            return None
+
+    def print_error(self, stage_name, job, exc_info):
+        """Default error handler. Prints traceback of failed job.
+
+        :arg stage_name: name of stage where job failed
+        :type stage_name: string
+
+        :arg job: failed job
+        :type job: object
+
+        :arg exc_info: exception info returned from sys.exc_info()
+        :type exc_info: tuple
+
+        """
+        print 'Stage ' + stage_name + ' failed.'
+        traceback.print_exception(*exc_info)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+# Prepares routing graph imported with osm2pgrouting for faster routing.
+# Script can be executed again after each import.
+
+import json
+import psycopg2
+
+
+class GraphPreparer(object):
+    """
+    GraphPreparer adds columns with precomputed driving time costs to ways
+    table, creates indexes used by routing, snapping and restriction
+    lookups and updates table statistics.
+
+    .. note:: Cost is length / maxspeed_forward and reverse cost is
+        reverse_cost / maxspeed_forward, the same as in PgRouting edge
+        query. Edges with zero maxspeed_forward get cost -1, so pgrouting
+        doesn't use them.
+
+    :arg connection: psycopg2 connection for database
+    :type connection: psycopg2._psycopg.connection
+
+    """
+
+    # List of (index name, table name, column name, index method). Names
+    # are the same as names of indexes created by pgr_createTopology.
+    INDEXES = [
+        ('ways_source_idx', 'ways', 'source', 'btree'),
+        ('ways_target_idx', 'ways', 'target', 'btree'),
+        ('ways_osm_id_idx', 'ways', 'osm_id', 'btree'),
+        ('ways_the_geom_idx', 'ways', 'the_geom', 'gist'),
+        ('ways_vertices_pgr_the_geom_idx', 'ways_vertices_pgr', 'the_geom',
+         'gist'),
+        ('restrictions_to_edge_idx', 'restrictions', 'to_edge', 'btree'),
+        ('restrictions_from_edge_idx', 'restrictions', 'from_edge', 'btree'),
+    ]
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+
+        self.run()
+
+    def run(self):
+        """Adds and fills cost columns, creates indexes and analyzes tables.
+        """
+        print 'Computing edge costs...'
+        self.add_cost_columns()
+
+        for index_name, table_name, column_name, method in self.INDEXES:
+            if not self.table_exists(table_name):
+                print 'Skipping ' + index_name + ', no ' + table_name + '.'
+                continue
+
+            # Index created by osm2pgrouting or earlier run may have other
+            # name, so indexed columns are compared.
+            if self.index_exists(table_name, column_name, method):
+                print 'Skipping ' + index_name + ', column is indexed.'
+                continue
+
+            print 'Creating index ' + index_name + '...'
+            self.cursor.execute(
+                'CREATE INDEX IF NOT EXISTS ' + index_name + ' ON ' +
+                table_name + ' USING ' + method + ' (' + column_name + ');'
+            )
+
+        # Update statistics, so planner knows about new columns and indexes.
+        for table_name in ('ways', 'ways_vertices_pgr', 'restrictions'):
+            if self.table_exists(table_name):
+                print 'Analyzing ' + table_name + '...'
+                self.cursor.execute('ANALYZE ' + table_name + ';')
+
+        self.connection.commit()
+
+    def add_cost_columns(self):
+        """Adds cost_time and reverse_cost_time columns to ways table and
+        computes their values. Existing values are recomputed.
+        """
+        self.cursor.execute(
+            """ALTER TABLE ways
+                ADD COLUMN IF NOT EXISTS cost_time double precision,
+                ADD COLUMN IF NOT EXISTS reverse_cost_time double precision;
+            """
+        )
+
+        self.cursor.execute(
+            """UPDATE ways SET
+                cost_time = COALESCE(
+                    length / NULLIF(maxspeed_forward, 0), -1),
+                reverse_cost_time = COALESCE(
+                    reverse_cost / NULLIF(maxspeed_forward, 0), -1);
+            """
+        )
+
+        self.connection.commit()
+
+    def table_exists(self, table_name):
+        """Checks if table exists in database.
+
+        :arg table_name: name of table
+        :type table_name: string
+
+        :returns: True if table exists
+        :rtype: boolean
+
+        """
+        self.cursor.execute(
+            """SELECT EXISTS(
+                SELECT * FROM information_schema.tables WHERE table_name=%s);
+            """,
+            (table_name,)
+        )
+
+        return self.cursor.fetchone()[0]
+
+    def index_exists(self, table_name, column_name, method):
+        """Checks if table has index of given method whose first column is
+        given column.
+
+        :arg table_name: name of table
+        :type table_name: string
+
+        :arg column_name: name of indexed column
+        :type column_name: string
+
+        :arg method: index method, e.g. 'btree' or 'gist'
+        :type method: string
+
+        :returns: True if column is already indexed
+        :rtype: boolean
+
+        """
+        self.cursor.execute(
+            """SELECT EXISTS(
+                SELECT * FROM pg_index
+                JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+                JOIN pg_am ON pg_am.oid = pg_class.relam
+                JOIN pg_attribute ON
+                    pg_attribute.attrelid = pg_index.indrelid AND
+                    pg_attribute.attnum = pg_index.indkey[0]
+                WHERE pg_index.indrelid = %s::regclass
+                AND pg_attribute.attname = %s
+                AND pg_am.amname = %s);
+            """,
+            (table_name, column_name, method)
+        )
+
+        return self.cursor.fetchone()[0]
+
+
+if __name__ == '__main__':
+    config_file = open('config.txt', 'r')
+    config_content = config_file.read()
+    config = json.loads(config_content)
+
+    connection = psycopg2.connect(
+        database=config['database']['name'],
+        user=config['database']['user'],
+        password=config['database']['password'],
+        host=config['database']['host']
+    )
+
+    GraphPreparer(connection=connection)
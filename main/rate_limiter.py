@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Budget file is not locked between processes on Windows.
+    fcntl = None
+
+
+class QuotaExceededError(Exception):
+    """Raised when daily quota of a service is used up."""
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter. Bucket is refilled with qps tokens per
+    second up to burst tokens and each request takes as many tokens as it
+    costs, one by default.
+
+    .. note:: Waiting thread reserves its tokens, so waiting threads are
+        served in the order they came. Request which costs more than burst
+        waits until the missing tokens are refilled.
+
+    :arg qps: allowed number of requests per second
+    :type qps: float
+
+    :arg burst: maximum number of requests that can be sent at once
+    :type burst: integer
+
+    """
+
+    def __init__(self, qps, burst):
+        self.qps = float(qps)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self, cost=1):
+        """Takes tokens and waits until they are available.
+
+        :arg cost: number of tokens taken by request
+        :type cost: integer
+
+        """
+        with self.lock:
+            now = time.time()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.qps
+            )
+            self.updated = now
+
+            self.tokens -= cost
+            wait_time = -self.tokens / self.qps
+
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class DailyBudget(object):
+    """Counts requests sent to each service today. Counts are saved to file,
+    so the budget is shared between executions on the same day.
+
+    .. note:: Executions running at the same time, e.g. shards on the same
+        host, share the file. File is locked, read again and merged before
+        each count is increased and written, so counts of other executions
+        are never overwritten.
+
+    :arg path: path to JSON file with counts
+    :type path: string
+
+    :arg quotas: dictionary service name --> daily number of requests,
+        e.g. {"google": 2500}
+    :type quotas: dictionary
+
+    """
+
+    def __init__(self, path, quotas):
+        self.path = path
+        self.quotas = quotas
+        self.lock = threading.Lock()
+
+        self.date = None
+        self.counts = {}
+
+        self.load()
+
+    def use(self, provider, cost=1):
+        """Counts request to service.
+
+        :arg provider: name of service, e.g. 'google'
+        :type provider: string
+
+        :arg cost: number of units counted for request, e.g. number of
+            elements of matrix request
+        :type cost: integer
+
+        :raises QuotaExceededError: if daily quota is used up or request
+            costs more than is left of it
+
+        """
+        if provider not in self.quotas:
+            return
+
+        with self.lock, self.lock_file():
+            # Other executions may have sent requests since last count.
+            self.load()
+
+            # Counts are reset when day changes.
+            today = datetime.date.today().isoformat()
+            if self.date != today:
+                self.date = today
+                self.counts = {}
+
+            count = self.counts.get(provider, 0)
+
+            if count + cost > self.quotas[provider]:
+                raise QuotaExceededError(
+                    'Daily quota of ' + str(self.quotas[provider]) +
+                    ' requests for ' + provider + ' is used up.'
+                )
+
+            self.counts[provider] = count + cost
+            self.save()
+
+    @contextlib.contextmanager
+    def lock_file(self):
+        """Holds exclusive lock of budget file, so only one process reads
+        and writes counts at the same time. Lock is released when lock file
+        is closed.
+
+        :returns: context manager which holds the lock
+        :rtype: contextlib.GeneratorContextManager
+
+        """
+        lock_file = open(self.path + '.lock', 'a')
+
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            yield
+        finally:
+            lock_file.close()
+
+    def load(self):
+        """Reads counts from file and merges them with counts of this
+        execution. Larger count of the same day is kept.
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'r') as budget_file:
+            budget = json.load(budget_file)
+
+        if budget['date'] != self.date:
+            self.date = budget['date']
+            self.counts = budget['counts']
+            return
+
+        for provider, count in budget['counts'].items():
+            self.counts[provider] = max(count, self.counts.get(provider, 0))
+
+    def save(self):
+        """Writes counts to file. File is replaced at once, so it is never
+        left half written.
+        """
+        temporary_path = self.path + '.tmp'
+
+        with open(temporary_path, 'w') as budget_file:
+            json.dump({'date': self.date, 'counts': self.counts}, budget_file)
+
+        os.rename(temporary_path, self.path)
+
+
+class RateLimiter(object):
+    """This class limits requests to each service with token bucket and
+    daily budget. Thread that sends request to throttled service waits,
+    while requests to other services go on.
+
+    .. note:: Services without settings are not limited.
+
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.budget = None
+
+    def configure(self, providers, budget_file=None):
+        """Sets limits for services.
+
+        :arg providers: dictionary service name --> settings with qps, burst
+            and daily_quota, e.g. {"google": {"qps": 10, "burst": 10,
+            "daily_quota": 2500}}
+        :type providers: dictionary
+
+        :arg budget_file: path to file with daily request counts, needed if
+            daily_quota is set
+        :type budget_file: string
+
+        """
+        self.buckets = {}
+        quotas = {}
+
+        for provider, settings in providers.items():
+            if settings.get('qps'):
+                self.buckets[provider] = TokenBucket(
+                    qps=settings['qps'],
+                    burst=settings.get('burst', 1)
+                )
+
+            if settings.get('daily_quota'):
+                quotas[provider] = settings['daily_quota']
+
+        if quotas:
+            self.budget = DailyBudget(path=budget_file, quotas=quotas)
+        else:
+            self.budget = None
+
+    def acquire(self, provider, cost=1):
+        """Waits until request to service can be sent. It is called for
+        each attempt, so retries are counted and throttled as well.
+
+        :arg provider: name of service, e.g. 'google'
+        :type provider: string
+
+        :arg cost: number of units counted for request, e.g. number of
+            elements of matrix request
+        :type cost: integer
+
+        :raises QuotaExceededError: if daily quota is used up
+
+        """
+        if self.budget is not None:
+            self.budget.use(provider, cost=cost)
+
+        if provider in self.buckets:
+            self.buckets[provider].acquire(cost=cost)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class ResponseCache(object):
+    """This class stores service responses in SQLite database on disk, so
+    repeated requests for the same route don't use service quota.
+
+    Responses are stored zlib compressed. Each response expires after ttl
+    seconds. When size of stored responses exceeds max_size_mb, least
+    recently used responses are deleted.
+
+    .. note:: Cache is disabled until it is configured with path.
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connection = None
+        self.ttl = 0
+        self.max_size = 0
+        self.total_size = 0
+
+    def configure(self, path, ttl=2592000, max_size_mb=512):
+        """Opens cache database and enables cache.
+
+        :arg path: path to cache database file
+        :type path: string
+
+        :arg ttl: number of seconds after which response expires,
+            default is 30 days
+        :type ttl: integer
+
+        :arg max_size_mb: maximum size of compressed responses in megabytes
+        :type max_size_mb: integer
+
+        """
+        self.close()
+
+        self.ttl = ttl
+        self.max_size = max_size_mb * 1024 * 1024
+
+        # Connection is used from many threads, access is guarded by lock.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.text_factory = str
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                data BLOB,
+                size INTEGER,
+                created REAL,
+                accessed REAL);
+            """
+        )
+        self.connection.execute(
+            """CREATE INDEX IF NOT EXISTS responses_accessed_idx
+                ON responses (accessed);
+            """
+        )
+        self.connection.commit()
+
+        self.total_size = self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()[0]
+
+    def is_enabled(self):
+        """Checks if cache is configured.
+
+        :returns: True if cache database is open
+        :rtype: boolean
+
+        """
+        return self.connection is not None
+
+    def create_key(self, provider, base_url, values):
+        """Creates cache key from request parameters. Api key is not part of
+        the cache key.
+
+        .. note:: Whitespace is removed from parameter values, so
+            '45.5, 15.5' and '45.5,15.5' give the same key.
+
+        :arg provider: name of service, e.g. 'google'
+        :type provider: string
+
+        :arg base_url: base service url
+        :type base_url: string
+
+        :arg values: dictonary with parameters for service api
+        :type values: dictionary
+
+        :returns: cache key
+        :rtype: string
+
+        """
+        normalized_values = sorted(
+            (name, ''.join(unicode(value).split()))
+            for name, value in values.items()
+        )
+
+        return hashlib.sha1(
+            json.dumps([provider, base_url, normalized_values])
+        ).hexdigest()
+
+    def get(self, key):
+        """Returns stored response for key.
+
+        :arg key: cache key
+        :type key: string
+
+        :returns: response data or None if response isn't stored or expired
+        :rtype: string
+
+        """
+        if self.connection is None:
+            return None
+
+        now = time.time()
+
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT data, size, created FROM responses WHERE key = ?',
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            data, size, created = row
+
+            if now - created > self.ttl:
+                self.connection.execute(
+                    'DELETE FROM responses WHERE key = ?', (key,)
+                )
+                self.connection.commit()
+                self.total_size -= size
+                return None
+
+            # Remember access time for LRU eviction.
+            self.connection.execute(
+                'UPDATE responses SET accessed = ? WHERE key = ?',
+                (now, key)
+            )
+            self.connection.commit()
+
+        return zlib.decompress(data)
+
+    def put(self, key, provider, response_data):
+        """Stores response and evicts least recently used responses if cache
+        is too big.
+
+        :arg key: cache key
+        :type key: string
+
+        :arg provider: name of service, e.g. 'google'
+        :type provider: string
+
+        :arg response_data: service response data
+        :type response_data: string
+
+        """
+        if self.connection is None:
+            return
+
+        data = zlib.compress(response_data)
+        now = time.time()
+
+        with self.lock:
+            old_row = self.connection.execute(
+                'SELECT size FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if old_row is not None:
+                self.total_size -= old_row[0]
+
+            self.connection.execute(
+                """INSERT OR REPLACE INTO responses
+                    (key, provider, data, size, created, accessed)
+                    VALUES (?, ?, ?, ?, ?, ?);
+                """,
+                (key, provider, sqlite3.Binary(data), len(data), now, now)
+            )
+            self.total_size += len(data)
+
+            self.evict()
+            self.connection.commit()
+
+    def evict(self):
+        """Deletes least recently used responses until cache size is below
+        the limit.
+
+        .. note:: Must be called while holding the lock.
+        """
+        while self.total_size > self.max_size:
+            rows = self.connection.execute(
+                """SELECT key, size FROM responses
+                    ORDER BY accessed ASC LIMIT 100;
+                """
+            ).fetchall()
+
+            if not rows:
+                self.total_size = 0
+                break
+
+            for key, size in rows:
+                if self.total_size <= self.max_size:
+                    break
+
+                self.connection.execute(
+                    'DELETE FROM responses WHERE key = ?', (key,)
+                )
+                self.total_size -= size
+
+    def close(self):
+        """Closes cache database."""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+import numpy
+
+from shapely import wkb as shapely_wkb
+from shapely.geometry import GeometryCollection, MultiLineString
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+# Route vertices are rounded to this number of decimal places (about 1 m)
+# before vertex hash is calculated.
+VERTEX_HASH_PRECISION = 5
+
+
+class RouteGeometry(object):
+    """Route of one provider prepared for comparison with other routes.
+    Prepared buffer, vertex hash and spatial index of route parts are
+    created once and reused for comparisons with all other routes.
+
+    :arg route: route geometry
+    :type route: shapely.geometry.LineString or
+        shapely.geometry.MultiLineString
+
+    :arg route_buffer: buffer around route
+    :type route_buffer: shapely.geometry.base.BaseGeometry
+
+    """
+
+    def __init__(self, route, route_buffer):
+        self.route = route
+        self.route_buffer = route_buffer
+        self.prepared_buffer = prep(route_buffer)
+
+        self.parts = get_parts(route)
+
+        self.vertex_hash = None
+        self.parts_tree = None
+
+    def get_vertex_hash(self):
+        """Calculates hash of route vertices. Routes with the same vertices
+        have the same hash, even if one is LineString and other is
+        MultiLineString.
+
+        :returns: hash of rounded vertex coordinates
+        :rtype: string
+
+        """
+        if self.vertex_hash is None:
+            self.vertex_hash = calculate_vertex_hash(self.parts)
+
+        return self.vertex_hash
+
+    def query_parts(self, geom):
+        """Finds route parts whose bounding box intersects bounding box of
+        geometry.
+
+        .. note:: Spatial index is created on first query, so routes which
+            are decided by cheap tests don't need it.
+
+        :arg geom: geometry, e.g. buffer of other route
+        :type geom: shapely.geometry.base.BaseGeometry
+
+        :returns: set of indexes to parts
+        :rtype: set
+
+        """
+        if self.parts_tree is None:
+            self.parts_tree = STRtree(self.parts)
+            self.part_indexes = dict(
+                (id(part), index) for index, part in enumerate(self.parts)
+            )
+
+        # Shapely 1.x returns geometries, shapely 2.x returns indexes.
+        return set(
+            self.part_indexes[id(item)] if hasattr(item, 'geom_type')
+            else int(item)
+            for item in self.parts_tree.query(geom)
+        )
+
+
+def calculate_vertex_hash(parts):
+    """Calculates hash of vertices of route parts.
+
+    :arg parts: list of route LineStrings
+    :type parts: list
+
+    :returns: hash of rounded vertex coordinates
+    :rtype: string
+
+    """
+    coords = numpy.concatenate(
+        [numpy.asarray(part.coords).reshape(-1, 2) for part in parts] +
+        [numpy.zeros((0, 2))]
+    )
+    coords = numpy.round(
+        coords * 10 ** VERTEX_HASH_PRECISION
+    ).astype(numpy.int64)
+
+    # Parts share junction vertices, so consecutive duplicates are dropped.
+    keep = numpy.ones(len(coords), dtype=bool)
+    keep[1:] = (coords[1:] != coords[:-1]).any(axis=1)
+
+    return hashlib.sha1(coords[keep].tobytes()).hexdigest()
+
+
+def get_parts(route):
+    """Returns list of route LineStrings.
+
+    :arg route: route geometry
+    :type route: shapely.geometry.LineString or
+        shapely.geometry.MultiLineString
+
+    :returns: list of LineStrings
+    :rtype: list
+
+    """
+    if route.geom_type == 'MultiLineString':
+        return list(route.geoms)
+
+    return [route]
+
+
+def bounds_intersect(bounds, other_bounds):
+    """Checks if two bounding boxes intersect.
+
+    :arg bounds: tuple (min x, min y, max x, max y)
+    :type bounds: tuple
+
+    :arg other_bounds: tuple (min x, min y, max x, max y)
+    :type other_bounds: tuple
+
+    :returns: True if bounding boxes intersect
+    :rtype: boolean
+
+    """
+    return not (
+        bounds[2] < other_bounds[0] or bounds[0] > other_bounds[2] or
+        bounds[3] < other_bounds[1] or bounds[1] > other_bounds[3]
+    )
+
+
+def get_lines(geom):
+    """Returns list of non-empty LineStrings of geometry.
+
+    :arg geom: result of difference between line and polygon
+    :type geom: shapely.geometry.base.BaseGeometry
+
+    :returns: list of LineStrings
+    :rtype: list
+
+    """
+    if geom.is_empty:
+        return []
+
+    if geom.geom_type == 'LineString':
+        return [geom]
+
+    if geom.geom_type in ('MultiLineString', 'GeometryCollection'):
+        return [
+            line for part in geom.geoms for line in get_lines(part)
+        ]
+
+    return []
+
+
+def calculate_difference(route_geometry, other_geometry):
+    """Calculates part of route which is outside of buffer of other route.
+
+    .. note:: Comparison goes from cheap to expensive tests. Routes with the
+        same vertices have empty difference and route which doesn't touch
+        bounding box of buffer is whole difference. Prepared buffer is used
+        to test if route is inside buffer. Otherwise parts of route are
+        compared one by one, parts outside of buffer bounding box are found
+        with spatial index and difference is calculated only for parts which
+        cross buffer boundary.
+
+    :arg route_geometry: route which is compared
+    :type route_geometry: RouteGeometry
+
+    :arg other_geometry: route of other provider
+    :type other_geometry: RouteGeometry
+
+    :returns: difference geometry, empty if route is inside buffer
+    :rtype: shapely.geometry.base.BaseGeometry
+
+    """
+    route = route_geometry.route
+    route_buffer = other_geometry.route_buffer
+    prepared_buffer = other_geometry.prepared_buffer
+
+    if route_geometry.get_vertex_hash() == other_geometry.get_vertex_hash():
+        return GeometryCollection()
+
+    if not bounds_intersect(route.bounds, route_buffer.bounds):
+        return route
+
+    if prepared_buffer.contains(route):
+        return GeometryCollection()
+
+    candidate_indexes = route_geometry.query_parts(route_buffer)
+    lines = []
+
+    for index, part in enumerate(route_geometry.parts):
+        if index not in candidate_indexes:
+            lines.append(part)
+        elif prepared_buffer.contains(part):
+            continue
+        elif not prepared_buffer.intersects(part):
+            lines.append(part)
+        else:
+            lines.extend(get_lines(part.difference(route_buffer)))
+
+    if not lines:
+        return GeometryCollection()
+
+    return MultiLineString(lines)
+
+
+def calculate_differences(routes):
+    """Calculates differences for all ordered pairs of routes.
+
+    :arg routes: list of (provider name, route, route buffer) tuples
+    :type routes: list
+
+    :returns: dictionary (provider, compared_to) --> difference geometry,
+        e.g. ('pgrouting', 'google') is part of pgrouting route outside of
+        google route buffer
+    :rtype: dictionary
+
+    """
+    route_geometries = [
+        (provider, RouteGeometry(route=route, route_buffer=route_buffer))
+        for provider, route, route_buffer in routes
+    ]
+
+    return dict(
+        ((provider, compared_to), calculate_difference(
+            route_geometry=route_geometry,
+            other_geometry=other_geometry
+        ))
+        for provider, route_geometry in route_geometries
+        for compared_to, other_geometry in route_geometries
+        if provider != compared_to
+    )
+
+
+def calculate_differences_wkb(routes_wkb):
+    """Calculates differences for all ordered pairs of routes provided as
+    WKB.
+
+    .. note:: Function is defined on module level because it is executed in
+        geometry worker processes.
+
+    :arg routes_wkb: list of (provider name, route WKB, route buffer WKB)
+        tuples
+    :type routes_wkb: list
+
+    :returns: dictionary (provider, compared_to) --> difference geometry WKB
+    :rtype: dictionary
+
+    """
+    differences = calculate_differences([
+        (provider,
+         shapely_wkb.loads(route_wkb),
+         shapely_wkb.loads(route_buffer_wkb))
+        for provider, route_wkb, route_buffer_wkb in routes_wkb
+    ])
+
+    return dict(
+        (pair, difference.wkb) for pair, difference in differences.items()
+    )
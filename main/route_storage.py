@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+
+import numpy
+
+from shapely.geometry import LineString, MultiLineString
+
+from google_polyline_decoder import GooglePolylineDecoder
+from google_polyline_encoder import GooglePolylineEncoder
+
+GOOGLE_POLYLINE_DECODER = GooglePolylineDecoder()
+GOOGLE_POLYLINE_ENCODER = GooglePolylineEncoder()
+
+
+class RouteStorage(object):
+    """This class converts route geometries to compact records and back.
+    Each line of route is stored as encoded polyline, e.g.
+    {"type": "MultiLineString", "precision": 5, "parts": ["_p~iF~ps|U..."]}.
+
+    .. note:: Coordinates are rounded to precision decimal places and
+        consecutive duplicate vertices are dropped.
+
+    :arg precision: number of decimal places which are kept, 5 (about 1 m)
+        or 6 (about 0.1 m)
+    :type precision: integer
+
+    """
+
+    def __init__(self, precision=5):
+        self.precision = precision
+
+    def encode_route(self, route):
+        """Converts route geometry to record.
+
+        :arg route: route geometry of any provider
+        :type route: shapely.geometry.LineString or
+            shapely.geometry.MultiLineString
+
+        :returns: dictionary with geometry type, precision and encoded parts
+        :rtype: dictionary
+
+        """
+        if route.geom_type == 'LineString':
+            lines = [route]
+        elif route.geom_type == 'MultiLineString':
+            lines = route.geoms
+        else:
+            raise ValueError(
+                'Route must be LineString or MultiLineString, not ' +
+                route.geom_type + '.'
+            )
+
+        return {
+            'type': route.geom_type,
+            'precision': self.precision,
+            'parts': [
+                GOOGLE_POLYLINE_ENCODER.encode_google_polyline(
+                    coords=numpy.asarray(line.coords),
+                    precision=self.precision
+                )
+                for line in lines
+            ],
+        }
+
+    def decode_route(self, record):
+        """Converts record created by encode_route back to route geometry.
+
+        :arg record: dictionary with geometry type, precision and encoded
+            parts
+        :type record: dictionary
+
+        :returns: route geometry
+        :rtype: shapely.geometry.LineString or
+            shapely.geometry.MultiLineString
+
+        """
+        coords, offsets = GOOGLE_POLYLINE_DECODER.decode_google_polylines(
+            point_strs=record['parts'],
+            precision=record['precision']
+        )
+
+        # Lines with less than two distinct points can't be restored.
+        lines = [
+            coords[start:end]
+            for start, end in zip(offsets[:-1], offsets[1:])
+            if end - start > 1
+        ]
+
+        if record['type'] == 'LineString':
+            return LineString(lines[0]) if lines else LineString()
+
+        return MultiLineString(lines)
+
+    def dumps(self, route):
+        """Converts route geometry to JSON string.
+
+        :arg route: route geometry of any provider
+        :type route: shapely.geometry.LineString or
+            shapely.geometry.MultiLineString
+
+        :returns: JSON string with encoded route
+        :rtype: string
+
+        """
+        return json.dumps(self.encode_route(route), separators=(',', ':'))
+
+    def loads(self, data):
+        """Converts JSON string created by dumps back to route geometry.
+
+        :arg data: JSON string with encoded route
+        :type data: string
+
+        :returns: route geometry
+        :rtype: shapely.geometry.LineString or
+            shapely.geometry.MultiLineString
+
+        """
+        return self.decode_route(json.loads(data))
+
+
+class EncodedRoutesWriter(object):
+    """Writes encoded routes of all providers to routes_encoded.jsonl file in
+    execution directory, one JSON object per route, e.g.
+    {"route": 5, "routes": {"google": {"type": "MultiLineString", ...}}}.
+
+    .. note:: Route which is processed again in resumed execution is
+        appended again, last record of the route is valid.
+
+    :arg run_dir: execution directory
+    :type run_dir: string
+
+    :arg precision: number of decimal places which are kept
+    :type precision: integer
+
+    """
+
+    def __init__(self, run_dir, precision=5):
+        self.filename = os.path.join(run_dir, 'routes_encoded.jsonl')
+        self.storage = RouteStorage(precision=precision)
+        self.lock = threading.Lock()
+
+        line_complete = True
+        if os.path.exists(self.filename) and os.path.getsize(self.filename):
+            with open(self.filename, 'rb') as routes_file:
+                routes_file.seek(-1, os.SEEK_END)
+                line_complete = routes_file.read(1) == b'\n'
+
+        self.routes_file = open(self.filename, 'a')
+
+        # Start new line after incomplete record of killed execution.
+        if not line_complete:
+            self.routes_file.write('\n')
+
+    def write_route(self, route_number, routes):
+        """Appends encoded routes of one location pair to file.
+
+        :arg route_number: ordinal of start-end location pair in input file
+        :type route_number: integer
+
+        :arg routes: dictionary provider name --> route geometry, e.g.
+            {"pgrouting": route, "google": route, "mapquest": route}
+        :type routes: dictionary
+
+        """
+        record = {
+            'route': route_number,
+            'routes': dict(
+                (provider, self.storage.encode_route(route))
+                for provider, route in routes.items()
+            ),
+        }
+
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+
+        with self.lock:
+            self.routes_file.write(line)
+            self.routes_file.flush()
+
+    def close(self):
+        """Closes encoded routes file."""
+        self.routes_file.close()
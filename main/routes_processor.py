@@ -1,39 +1,58 @@
 # -*- coding: utf-8 -*-
 import datetime as DT
+import itertools
+import multiprocessing
 
+from shapely import wkb as shapely_wkb
 from osgeo import ogr
 
-from utility import Utility
+from geometry_exporter import GeoJsonExporter
+from route_comparator import calculate_differences, calculate_differences_wkb
 
-UTILITY = Utility()
+# Provider name --> (short name used in output file names, title used in
+# details file). Providers which are not listed use their name for both.
+PROVIDER_NAMES = {
+    'pgrouting': ('pg', 'PgRouting'),
+    'mapquest': ('mapquest', 'MapQuest'),
+    'google': ('google', 'Google'),
+}
 
 
 class RoutesProcessor(object):
     """This class contains methods for processing routes geometries and
     attributes and saving results to files.
+
+    .. note:: Routes of any number of providers can be processed. Routes
+        data are provided as list of (provider name, route data) tuples,
+        e.g. [('pgrouting', pgrouting_data), ('google', google_data)], where
+        route data is dictionary with 'route', 'route_buffer',
+        'driving_time' and 'len'.
+
+    :arg processes: number of worker processes for calculating geometry
+        differences. If 0, differences are calculated in calling thread.
+    :type processes: integer
+
+    :arg exporter: route exporter, GeoJsonExporter if not set
+    :type exporter: geometry_exporter.GeoJsonExporter or
+        geometry_exporter.GeoPackageExporter
+
     """
 
-    def process_geometry(
-            self,
-            pgrouting_data,
-            google_data,
-            mapquest_data,
-            route_number,
-            foldername):
-        """Processes provided routes geometries and executes geometries
-        export function. It calculates differences between provided routes.
+    def __init__(self, processes=0, exporter=None):
+        self.exporter = exporter or GeoJsonExporter()
 
-        :arg pgrouting_data: dictionary with geometry and attribute data for
-            pgrouting route.
-        :type pgrouting_data: dictionary
+        # Create worker processes before any thread is started.
+        if processes > 0:
+            self.pool = multiprocessing.Pool(processes=processes)
+        else:
+            self.pool = None
 
-        :arg google_data: dictionary with geometry and attribute data for
-            google route.
-        :type google_data: dictionary
+    def process_geometry(self, routes_data, route_number, foldername):
+        """Processes provided routes geometries and executes geometries
+        export function. It calculates differences between provided routes.
 
-        :arg mapquest_data: dictionary with geometry and attribute data for
-            mapquest route.
-        :type mapquest_data: dictionary
+        :arg routes_data: list of (provider name, route data) tuples
+        :type routes_data: list
 
         :arg route_number: ordinal of start-end location pair in input file
         :type route_number: integer
@@ -42,250 +61,180 @@ class RoutesProcessor(object):
         :type foldername: string
 
         """
-        # Difference between pg_route and mapquest route.
-        # Returns pg_route geom where two routes differentiate.
-        pg_mapquest_diff = pgrouting_data['route_shapely'].difference(
-            mapquest_data['route_buffer_shapely']
-        )
-
-        # Difference between mapquest and pg route.
-        # Returns mapquest_route geom where two routes differentiate.
-        mapquest_pg_diff = mapquest_data['route_shapely'].difference(
-            pgrouting_data['route_buffer_shapely']
-        )
-
-        # Difference between pg_route and google route.
-        # Returns pg_route geom where two routes differentiate.
-        pg_google_diff = pgrouting_data['route_shapely'].difference(
-            google_data['route_buffer_shapely']
-        )
-
-        # Difference between google and pg route.
-        # Returns google_route geom where two routes differentiate.
-        google_pg_diff = google_data['route_shapely'].difference(
-            pgrouting_data['route_buffer_shapely']
-        )
-
-        # Difference between google and mapquest route.
-        # Returns google geom where two routes differentiate.
-        google_mapquest_diff = google_data['route_shapely'].difference(
-            mapquest_data['route_buffer_shapely']
-        )
-
-        # Difference between mapquest and google route.
-        # Returns mapquest_route geom where two routes differentiate.
-        mapquest_google_diff = mapquest_data['route_shapely'].difference(
-            google_data['route_buffer_shapely']
-        )
-
-        # Convert route difference geom from shapely to ogr (for export).
-        pg_mapquest_diff_ogr = ogr.CreateGeometryFromWkb(pg_mapquest_diff.wkb)
-        mapquest_pg_diff_ogr = ogr.CreateGeometryFromWkb(mapquest_pg_diff.wkb)
-        pg_google_diff_ogr = ogr.CreateGeometryFromWkb(pg_google_diff.wkb)
-        google_pg_diff_ogr = ogr.CreateGeometryFromWkb(google_pg_diff.wkb)
-        google_mapquest_diff_ogr = ogr.CreateGeometryFromWkb(
-            google_mapquest_diff.wkb
-        )
-        mapquest_google_diff_ogr = ogr.CreateGeometryFromWkb(
-            mapquest_google_diff.wkb
-        )
+        differences = self.compute_differences(routes_data=routes_data)
 
         self.export_geometries(
-            pgrouting_data=pgrouting_data,
-            google_data=google_data,
-            mapquest_data=mapquest_data,
-            pg_mapquest_diff_ogr=pg_mapquest_diff_ogr,
-            mapquest_pg_diff_ogr=mapquest_pg_diff_ogr,
-            pg_google_diff_ogr=pg_google_diff_ogr,
-            google_pg_diff_ogr=google_pg_diff_ogr,
-            google_mapquest_diff_ogr=google_mapquest_diff_ogr,
-            mapquest_google_diff_ogr=mapquest_google_diff_ogr,
+            routes_data=routes_data,
+            differences=differences,
             route_number=route_number,
-            foldername=foldername,
+            foldername=foldername
         )
 
-    def export_geometries(
-            self,
-            pgrouting_data, google_data, mapquest_data,
-            pg_mapquest_diff_ogr, mapquest_pg_diff_ogr,
-            pg_google_diff_ogr, google_pg_diff_ogr,
-            google_mapquest_diff_ogr, mapquest_google_diff_ogr,
-            route_number, foldername):
+    def compute_differences(self, routes_data):
+        """Calculates differences between all ordered pairs of provided
+        routes. Difference returns route geom where route and buffered route
+        of other provider differentiate.
+
+        .. note:: Comparison is done by route_comparator, which creates
+            prepared buffer and spatial index of each route once and uses
+            them for all pairs.
 
-        """Executes export of routes geometries to GeoJson files.
+        :arg routes_data: list of (provider name, route data) tuples
+        :type routes_data: list
 
-        :arg pgrouting_data: dictionary with geometry and attribute data for
-            pgrouting route.
-        :type pgrouting_data: dictionary
+        :returns: dictionary (provider, compared_to) --> shapely difference
+            geometry, e.g. ('pgrouting', 'google') is part of pgrouting route
+            outside of google route buffer
+        :rtype: dictionary
 
-        :arg google_data: dictionary with geometry and attribute data for
-            google route.
-        :type google_data: dictionary
+        """
+        if self.pool is not None:
+            # Send geometries to worker process as WKB, so shapely objects
+            # are never pickled. Calling thread waits for the result, while
+            # other threads can use other worker processes.
+            differences_wkb = self.pool.apply(
+                calculate_differences_wkb,
+                args=([
+                    (provider, data['route'].wkb, data['route_buffer'].wkb)
+                    for provider, data in routes_data
+                ],)
+            )
 
-        :arg mapquest_data: dictionary with geometry and attribute data for
-            mapquest route.
-        :type mapquest_data: dictionary
+            return dict(
+                (pair, shapely_wkb.loads(difference_wkb))
+                for pair, difference_wkb in differences_wkb.items()
+            )
 
-        :arg pg_mapquest_diff_ogr: ogr geometry that respresent difference
-            between pgrouting and mapquest route.
-        :type pg_mapquest_diff_ogr: osgeo.ogr.Geometry
+        return calculate_differences([
+            (provider, data['route'], data['route_buffer'])
+            for provider, data in routes_data
+        ])
 
-        :arg mapquest_pg_diff_ogr: ogr geometry that respresent difference
-            between mapquest and pgrouting route.
-        :type mapquest_pg_diff_ogr: osgeo.ogr.Geometry
+    def close(self):
+        """Stops geometry worker processes if they are used and closes route
+        exporter.
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
 
-        :arg pg_google_diff_ogr: ogr geometry that respresent difference
-            between pgrouting and google route.
-        :type pg_google_diff_ogr: osgeo.ogr.Geometry
+        self.exporter.close()
 
-        :arg google_pg_diff_ogr: ogr geometry that respresent difference
-            between google and pgrouting route.
-        :type google_pg_diff_ogr: osgeo.ogr.Geometry
+    def export_geometries(
+            self, routes_data, differences, route_number, foldername):
+        """Executes export of routes geometries with route exporter, e.g. to
+        GeoJson files or to GeoPackage. Route and buffer of each provider
+        and all differences are exported, e.g. pg_route, pg_buffer and
+        pg_google_diff.
 
-        :arg mapquest_google_diff_ogr: ogr geometry that respresent difference
-            between mapquest and google route.
-        :type mapquest_google_diff_ogr: osgeo.ogr.Geometry
+        :arg routes_data: list of (provider name, route data) tuples
+        :type routes_data: list
 
-        :arg google_mapquest_diff_ogr: ogr geometry that respresent difference
-            between google and mapquest route.
-        :type google_mapquest_diff_ogr: osgeo.ogr.Geometry
+        :arg differences: dictionary (provider, compared_to) --> shapely
+            difference geometry
+        :type differences: dictionary
 
         :arg route_number: ordinal of start-end location pair in input file
         :type route_number: integer
 
-        :arg foldername: path to directory for saving results
+        :arg foldername: path to directory for saving results, None if route
+            exporter doesn't use route directories
         :type foldername: string
 
         """
-        UTILITY.create_geojson_file(
-            geom=pgrouting_data['route_ogr'],
-            geomtype=ogr.wkbMultiLineString,
-            filename=foldername + '/pg_route_' + str(route_number)
-        )
-        UTILITY.create_geojson_file(
-            geom=pgrouting_data['route_buffer_ogr'],
-            geomtype=ogr.wkbMultiPolygon,
-            filename=foldername + '/pg_buffer_' + str(route_number)
-        )
+        records = []
 
-        UTILITY.create_geojson_file(
-            geom=google_data['route_ogr'],
-            geomtype=ogr.wkbMultiLineString,
-            filename=foldername + '/google_route_' + str(route_number)
-        )
-        UTILITY.create_geojson_file(
-            geom=google_data['route_buffer_ogr'],
-            geomtype=ogr.wkbMultiPolygon,
-            filename=foldername + '/google_buffer_' + str(route_number)
-        )
+        for provider, data in routes_data:
+            short_name = self.get_short_name(provider)
 
-        UTILITY.create_geojson_file(
-            geom=mapquest_data['route_ogr'],
-            geomtype=ogr.wkbLineString,
-            filename=foldername + '/mapquest_route_' + str(route_number)
-        )
-        UTILITY.create_geojson_file(
-            geom=mapquest_data['route_buffer_ogr'],
-            geomtype=ogr.wkbMultiPolygon,
-            filename=foldername + '/mapquest_buffer_' + str(route_number)
-        )
+            if data['route'].geom_type == 'LineString':
+                route_geomtype = ogr.wkbLineString
+            else:
+                route_geomtype = ogr.wkbMultiLineString
 
-        UTILITY.create_geojson_file(
-            geom=pg_mapquest_diff_ogr,
-            geomtype=ogr.wkbMultiLineString,
-            filename=foldername + '/pg_mapquest_diff_' + str(route_number)
-        )
+            records.append(
+                {'name': short_name + '_route', 'layer': 'routes',
+                 'provider': provider, 'compared_to': None,
+                 'geom': data['route'],
+                 'geomtype': route_geomtype}
+            )
+            records.append(
+                {'name': short_name + '_buffer', 'layer': 'buffers',
+                 'provider': provider, 'compared_to': None,
+                 'geom': data['route_buffer'],
+                 'geomtype': ogr.wkbMultiPolygon}
+            )
 
-        UTILITY.create_geojson_file(
-            geom=mapquest_pg_diff_ogr,
-            geomtype=ogr.wkbMultiLineString,
-            filename=foldername + '/mapquest_pg_diff_' + str(route_number)
-        )
+        for provider, compared_to in sorted(differences):
+            records.append(
+                {'name': (
+                    self.get_short_name(provider) + '_' +
+                    self.get_short_name(compared_to) + '_diff'),
+                 'layer': 'differences',
+                 'provider': provider, 'compared_to': compared_to,
+                 'geom': differences[(provider, compared_to)],
+                 'geomtype': ogr.wkbMultiLineString}
+            )
 
-        UTILITY.create_geojson_file(
-            geom=pg_google_diff_ogr,
-            geomtype=ogr.wkbMultiLineString,
-            filename=foldername + '/pg_google_diff_' + str(route_number)
+        self.exporter.write_route(
+            route_number=route_number,
+            foldername=foldername,
+            records=records
         )
 
-        UTILITY.create_geojson_file(
-            geom=google_pg_diff_ogr,
-            geomtype=ogr.wkbMultiLineString,
-            filename=foldername + '/google_pg_diff_' + str(route_number)
-        )
+    def get_short_name(self, provider):
+        """Returns provider name used in output file names, e.g. 'pg'.
 
-        UTILITY.create_geojson_file(
-            geom=google_mapquest_diff_ogr,
-            geomtype=ogr.wkbMultiLineString,
-            filename=foldername + '/google_mapquest_diff_' + str(route_number)
-        )
+        :arg provider: provider name, e.g. 'pgrouting'
+        :type provider: string
 
-        UTILITY.create_geojson_file(
-            geom=mapquest_google_diff_ogr,
-            geomtype=ogr.wkbMultiLineString,
-            filename=foldername + '/mapquest_google_diff_' + str(route_number)
-        )
+        :returns: short provider name
+        :rtype: string
 
-    def process_attributes(
-            self,
-            pgrouting_data,
-            google_data,
-            mapquest_data,
-            route_number,
-            foldername):
-        """Executes function for calculating numerical attribute data
-        differences between two routes and function for writing route details
-        and differences to file.
+        """
+        return PROVIDER_NAMES.get(provider, (provider, provider))[0]
 
-        :arg pgrouting_data: dictionary with geometry and attribute data for
-            pgrouting route.
-        :type pgrouting_data: dictionary
+    def get_title(self, provider):
+        """Returns provider name used in details file, e.g. 'PgRouting'.
 
-        :arg google_data: dictionary with geometry and attribute data for
-            google route.
-        :type google_data: dictionary
+        :arg provider: provider name, e.g. 'pgrouting'
+        :type provider: string
 
-        :arg mapquest_data: dictionary with geometry and attribute data for
-            mapquest route.
-        :type mapquest_data: dictionary
+        :returns: provider title
+        :rtype: string
+
+        """
+        return PROVIDER_NAMES.get(provider, (provider, provider))[1]
+
+    def process_attributes(self, routes_data, route_number, foldername):
+        """Executes function for calculating numerical attribute data
+        differences between each two routes and function for writing route
+        details and differences with route exporter.
+
+        :arg routes_data: list of (provider name, route data) tuples
+        :type routes_data: list
 
         :arg route_number: ordinal of start-end location pair in input file
         :type route_number: integer
 
-        :arg foldername: path to directory for saving results
+        :arg foldername: path to directory for saving results, None if route
+            exporter doesn't use route directories
         :type foldername: string
 
         """
-
-        pg_mapquest_diff_attribute_data = (
-            self.get_route_detail_differences(
-                route1_data=pgrouting_data,
-                route2_data=mapquest_data
-            )
-        )
-
-        pg_google_diff_attribute_data = (
-            self.get_route_detail_differences(
-                route1_data=pgrouting_data,
-                route2_data=google_data
-            )
-        )
-
-        mapquest_google_diff_attribute_data = (
-            self.get_route_detail_differences(
-                route1_data=mapquest_data,
-                route2_data=google_data
-            )
-        )
-
-        self.write_details_to_file(
-            pgrouting_data=pgrouting_data,
-            google_data=google_data,
-            mapquest_data=mapquest_data,
-            pg_mapquest_diff_attribute_data=pg_mapquest_diff_attribute_data,
-            pg_google_diff_attribute_data=pg_google_diff_attribute_data,
-            mapquest_google_diff_attribute_data=(
-                mapquest_google_diff_attribute_data),
+        # List of (provider, compared_to, differences) for each two routes.
+        attribute_differences = [
+            (provider, compared_to, self.get_route_detail_differences(
+                route1_data=data,
+                route2_data=compared_data
+            ))
+            for (provider, data), (compared_to, compared_data)
+            in itertools.combinations(routes_data, 2)
+        ]
+
+        self.write_details(
+            routes_data=routes_data,
+            attribute_differences=attribute_differences,
             route_number=route_number,
             foldername=foldername
         )
@@ -350,97 +299,68 @@ class RoutesProcessor(object):
             'length_percent_diff': route1_route2_length_percent_diff,
         }
 
-    def write_details_to_file(
+    def write_details(
             self,
-            pgrouting_data,
-            google_data,
-            mapquest_data,
-            pg_mapquest_diff_attribute_data,
-            pg_google_diff_attribute_data,
-            mapquest_google_diff_attribute_data,
+            routes_data,
+            attribute_differences,
             route_number,
             foldername):
 
-        """Writes routes detail and differences between routes to file.
+        """Writes routes detail and differences between routes with route
+        exporter, e.g. to details.txt file in route directory or to
+        GeoPackage.
 
         .. note:: MISSING GOOGLE DETAILED DATA!
 
-        :arg pgrouting_data: dictionary with geometry and attribute data for
-            pgrouting route.
-        :type pgrouting_data: dictionary
+        :arg routes_data: list of (provider name, route data) tuples
+        :type routes_data: list
 
-        :arg google_data: dictionary with geometry and attribute data for
-            google route.
-        :type google_data: dictionary
-
-        :arg mapquest_data: dictionary with geometry and attribute data for
-            mapquest route.
-        :type mapquest_data: dictionary
-
-        :arg pg_mapquest_diff_attribute_data: dictionary with differences
-            between pgrouting and mapquest route, like length and driving time.
-        :type pg_mapquest_diff_attribute_data: dictionary
+        :arg attribute_differences: list of (provider, compared_to,
+            differences) tuples, where differences is dictionary with
+            differences between two routes, like length and driving time.
+        :type attribute_differences: list
 
         :arg route_number: ordinal of start-end location pair in input file
         :type route_number: integer
 
-        :arg foldername: path to directory for saving file
+        :arg foldername: path to directory for saving file, None if route
+            exporter doesn't use route directories
         :type foldername: string
 
         """
-        # Open file for writing in route output directory.
-        details_file = open(foldername + '/details.txt', 'w')
-
-        # Write PgRouting route details to file.
-        details_file.write(
-            self.compose_route_details_text(
-                route_data=pgrouting_data,
-                title='PgRouting route ' + str(route_number)
+        details = []
+
+        # Compose route details of each provider.
+        for provider, data in routes_data:
+            details.append(
+                self.compose_route_details_text(
+                    route_data=data,
+                    title=(
+                        self.get_title(provider) + ' route ' +
+                        str(route_number)
+                    )
+                )
             )
-        )
 
-        # Write MapQuest route details to file.
-        details_file.write(
-            self.compose_route_details_text(
-                route_data=mapquest_data,
-                title='MapQuest route ' + str(route_number)
+        # Compose differences of each two routes.
+        for provider, compared_to, diff_data in attribute_differences:
+            details.append(
+                self.compose_route_comparison_text(
+                    diff_data=diff_data,
+                    title=(
+                        self.get_title(provider) + ' vs. ' +
+                        self.get_title(compared_to) + ' - route ' +
+                        str(route_number)
+                    )
+                )
             )
-        )
 
-        # Write Google route details to file.
-        details_file.write(
-            self.compose_route_details_text(
-                route_data=google_data,
-                title='Google route ' + str(route_number)
-            )
-        )
-
-        # Write PgRouting and MapQuest route differences to file.
-        details_file.write(
-            self.compose_route_comparison_text(
-                diff_data=pg_mapquest_diff_attribute_data,
-                title='PgRouting vs. MapQuest - route ' + str(route_number)
-            )
-        )
-
-        # Write PgRouting and Google route differences to file.
-        details_file.write(
-            self.compose_route_comparison_text(
-                diff_data=pg_google_diff_attribute_data,
-                title='PgRouting vs. Google - route ' + str(route_number)
-            )
-        )
-
-        # Write Mapquest and Google route differences to file.
-        details_file.write(
-            self.compose_route_comparison_text(
-                diff_data=mapquest_google_diff_attribute_data,
-                title='Mapquest vs. Google - route ' + str(route_number)
-            )
+        self.exporter.write_details(
+            route_number=route_number,
+            foldername=foldername,
+            details=''.join(details)
         )
 
-        details_file.close()
-
     def compose_route_details_text(self, route_data, title):
         """Creates a string with route details that will be written to file.
 
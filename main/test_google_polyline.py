@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import numpy
+
+from google_polyline_decoder import GooglePolylineDecoder
+
+DECODER = GooglePolylineDecoder()
+
+# Example from Google's polyline algorithm documentation, (longitude,
+# latitude) points.
+EXAMPLE_COORDS = [(-120.2, 38.5), (-120.95, 40.7), (-126.453, 43.252)]
+EXAMPLE_POLYLINE = '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+
+
+class GooglePolylineTest(unittest.TestCase):
+    """Tests for decoding polylines with Google's algorithm.
+    """
+
+    def test_decode_example(self):
+        numpy.testing.assert_allclose(
+            DECODER.decode_google_polyline(EXAMPLE_POLYLINE), EXAMPLE_COORDS
+        )
+
+    def test_decode_many_polylines(self):
+        # First polyline is the first point of the example.
+        coords, offsets = DECODER.decode_google_polylines(
+            ['_p~iF~ps|U', EXAMPLE_POLYLINE]
+        )
+
+        self.assertEqual(list(offsets), [0, 1, 4])
+        numpy.testing.assert_allclose(coords[:1], EXAMPLE_COORDS[:1])
+        numpy.testing.assert_allclose(coords[1:], EXAMPLE_COORDS)
+
+    def test_decode_empty_string(self):
+        coords = DECODER.decode_google_polyline('')
+
+        self.assertEqual(coords.shape, (0, 2))
+
+    def test_decode_empty_list(self):
+        coords, offsets = DECODER.decode_google_polylines([])
+
+        self.assertEqual(coords.shape, (0, 2))
+        self.assertEqual(list(offsets), [0])
+
+    def test_decode_empty_strings_between_polylines(self):
+        coords, offsets = DECODER.decode_google_polylines(
+            ['', EXAMPLE_POLYLINE, '']
+        )
+
+        numpy.testing.assert_allclose(coords, EXAMPLE_COORDS)
+        self.assertEqual(list(offsets), [0, 0, 3, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
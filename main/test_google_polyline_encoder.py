@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import numpy
+
+from google_polyline_decoder import GooglePolylineDecoder
+from google_polyline_encoder import GooglePolylineEncoder
+
+DECODER = GooglePolylineDecoder()
+ENCODER = GooglePolylineEncoder()
+
+# Example from Google's polyline algorithm documentation, (longitude,
+# latitude) points.
+EXAMPLE_COORDS = [(-120.2, 38.5), (-120.95, 40.7), (-126.453, 43.252)]
+EXAMPLE_POLYLINE = '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+
+
+class GooglePolylineEncoderTest(unittest.TestCase):
+    """Tests for encoding polylines with Google's algorithm and decoding
+    them back.
+    """
+
+    def random_coords(self, count, precision, seed):
+        """Creates random (longitude, latitude) points rounded to precision.
+
+        :arg count: number of points
+        :type count: integer
+
+        :arg precision: number of decimal places
+        :type precision: integer
+
+        :arg seed: seed of random generator
+        :type seed: integer
+
+        :returns: array of shape (count, 2)
+        :rtype: numpy.ndarray
+
+        """
+        random = numpy.random.RandomState(seed)
+        coords = numpy.column_stack((
+            random.uniform(-180, 180, count),
+            random.uniform(-90, 90, count)
+        ))
+
+        return numpy.round(coords, precision)
+
+    def test_encode_example(self):
+        self.assertEqual(
+            ENCODER.encode_google_polyline(EXAMPLE_COORDS), EXAMPLE_POLYLINE
+        )
+
+    def test_decode_precision(self):
+        # The same polyline read with 6 decimal places.
+        numpy.testing.assert_allclose(
+            DECODER.decode_google_polyline(EXAMPLE_POLYLINE, precision=6),
+            numpy.array(EXAMPLE_COORDS) / 10
+        )
+
+    def test_round_trip(self):
+        for precision in (5, 6):
+            coords = self.random_coords(
+                count=500, precision=precision, seed=precision
+            )
+
+            polyline = ENCODER.encode_google_polyline(
+                coords, precision=precision
+            )
+            decoded = DECODER.decode_google_polyline(
+                polyline, precision=precision
+            )
+
+            numpy.testing.assert_allclose(decoded, coords, atol=1e-9)
+
+    def test_round_trip_many_polylines(self):
+        coords_list = [
+            self.random_coords(count=count, precision=5, seed=count)
+            for count in (3, 1, 50)
+        ]
+        point_strs = [
+            ENCODER.encode_google_polyline(coords) for coords in coords_list
+        ]
+
+        coords, offsets = DECODER.decode_google_polylines(point_strs)
+
+        self.assertEqual(list(offsets), [0, 3, 4, 54])
+        for index, expected in enumerate(coords_list):
+            numpy.testing.assert_allclose(
+                coords[offsets[index]:offsets[index + 1]], expected,
+                atol=1e-9
+            )
+
+    def test_encode_empty(self):
+        self.assertEqual(ENCODER.encode_google_polyline([]), '')
+
+    def test_round_trip_empty(self):
+        polyline = ENCODER.encode_google_polyline([])
+
+        self.assertEqual(
+            DECODER.decode_google_polyline(polyline).shape, (0, 2)
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from matrix_batcher import MatrixBatcher
+
+
+def create_job(route_number, start, end):
+    """Creates job like Main.create_job from (x, y) tuples.
+
+    :arg route_number: ordinal of start-end location pair
+    :type route_number: integer
+
+    :arg start: starting location (x, y)
+    :type start: tuple
+
+    :arg end: ending location (x, y)
+    :type end: tuple
+
+    :returns: dictionary with route number and coordinates
+    :rtype: dictionary
+
+    """
+    return {
+        'route_number': route_number,
+        'start_coords': {'x': start[0], 'y': start[1]},
+        'end_coords': {'x': end[0], 'y': end[1]},
+        'start_coords_string': str(start[1]) + ', ' + str(start[0]),
+        'end_coords_string': str(end[1]) + ', ' + str(end[0]),
+    }
+
+
+class MatrixBatcherTest(unittest.TestCase):
+    """Tests for grouping location pairs to matrix requests.
+    """
+
+    def get_route_numbers(self, batches):
+        """Returns sorted route numbers of each batch.
+
+        :arg batches: list of batches
+        :type batches: list
+
+        :returns: sorted list of sorted lists of route numbers
+        :rtype: list
+
+        """
+        return sorted(
+            sorted(job['route_number'] for job in batch['jobs'])
+            for batch in batches
+        )
+
+    def test_shared_origin(self):
+        jobs = [
+            create_job(0, (15.0, 45.0), (16.0, 43.0)),
+            create_job(1, (15.0, 45.0), (14.0, 44.0)),
+            create_job(2, (13.0, 42.0), (12.0, 41.0)),
+        ]
+
+        batches = MatrixBatcher().group_jobs(jobs)
+
+        self.assertEqual(self.get_route_numbers(batches), [[0, 1], [2]])
+
+        batch = [batch for batch in batches if len(batch['jobs']) == 2][0]
+        self.assertEqual(len(batch['origins']), 1)
+        self.assertEqual(len(batch['destinations']), 2)
+        self.assertEqual(batch['cells'], [(0, 0), (0, 1)])
+
+    def test_shared_destination(self):
+        jobs = [
+            create_job(0, (15.0, 45.0), (16.0, 43.0)),
+            create_job(1, (14.0, 44.0), (16.0, 43.0)),
+        ]
+
+        batches = MatrixBatcher().group_jobs(jobs)
+
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(batches[0]['origins']), 2)
+        self.assertEqual(len(batches[0]['destinations']), 1)
+        self.assertEqual(batches[0]['cells'], [(0, 0), (1, 0)])
+
+    def test_coordinates_are_normalized(self):
+        jobs = [
+            create_job(0, (15.0, 45.0), (16.0, 43.0)),
+            create_job(1, (15.000001, 45.0000004), (14.0, 44.0)),
+        ]
+
+        batches = MatrixBatcher(coordinate_precision=5).group_jobs(jobs)
+
+        self.assertEqual(self.get_route_numbers(batches), [[0, 1]])
+
+    def test_batch_size(self):
+        jobs = [
+            create_job(index, (15.0, 45.0), (16.0, 40.0 + index))
+            for index in range(5)
+        ]
+
+        batches = MatrixBatcher(batch_size=2).group_jobs(jobs)
+
+        self.assertEqual(
+            self.get_route_numbers(batches), [[0, 1], [2, 3], [4]]
+        )
+
+    def test_distinct_pairs_are_packed(self):
+        jobs = [
+            create_job(index, (10.0 + index, 45.0), (20.0 + index, 43.0))
+            for index in range(5)
+        ]
+
+        self.assertEqual(len(MatrixBatcher().group_jobs(jobs)), 5)
+
+        batches = MatrixBatcher(max_elements_per_pair=4).group_jobs(jobs)
+
+        self.assertEqual(self.get_route_numbers(batches), [[0, 1, 2, 3], [4]])
+        self.assertEqual(
+            batches[0]['cells'], [(0, 0), (1, 1), (2, 2), (3, 3)]
+        )
+
+    def test_packing_limited_by_max_elements(self):
+        jobs = [
+            create_job(index, (10.0 + index, 45.0), (20.0 + index, 43.0))
+            for index in range(5)
+        ]
+
+        batches = MatrixBatcher(
+            max_elements=4, max_elements_per_pair=10
+        ).group_jobs(jobs)
+
+        self.assertEqual(
+            self.get_route_numbers(batches), [[0, 1], [2, 3], [4]]
+        )
+
+    def test_buffer_size(self):
+        jobs = [
+            create_job(index, (15.0, 45.0), (16.0, 40.0 + index))
+            for index in range(4)
+        ]
+
+        batches = list(MatrixBatcher().create_batches(jobs, buffer_size=3))
+
+        self.assertEqual(self.get_route_numbers(batches), [[0, 1, 2], [3]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,61 +1,42 @@
 # -*- coding: utf-8 -*-
-import urllib2
 import urllib
 
-from osgeo import ogr, osr
-import copy
+from osgeo import ogr
+
+from http_client import HttpClient
+from response_cache import ResponseCache
+from rate_limiter import RateLimiter
+from buffer_engine import BufferEngine
+
+# HTTP client shared by all services, so connections are reused.
+HTTP_CLIENT = HttpClient()
+# Response cache shared by all services, disabled until configured.
+RESPONSE_CACHE = ResponseCache()
+# Rate limiter shared by all services, no limits until configured.
+RATE_LIMITER = RateLimiter()
+# Buffer engine shared by all routes.
+BUFFER_ENGINE = BufferEngine()
 
 
 class Utility(object):
     """This class contains methods that are used for different objects."""
 
     def create_route_buffer(self, route):
-        """Creates buffer around provided route.
-
-        .. warning:: Because of making a copy of ogr geometry it will throw
-            errors to console, but it's okay.
+        """Creates buffer around provided route with shared buffer engine.
 
-        .. note:: For creating buffer route has to be cloned first, then cloned
-            route is transformed from epsg:4326 to epsg:3857 because we need
-            geometry in metric units to be able to set buffer distance in
-            meters. After buffer is created it has to be transformed back to
-            original crs (epsg: 4326).
+        .. note:: Route is transformed from epsg:4326 to epsg:3857 because
+            we need geometry in metric units to be able to set buffer
+            distance in meters. After buffer is created it is transformed
+            back to original crs (epsg: 4326).
 
-        :arg route: ogr geometry representing route
-        :type route: osgeo.ogr.geometry
+        :arg route: shapely geometry representing route
+        :type route: shapely.geometry.base.BaseGeometry
 
         :returns: route buffer geometry
-        :rtype: osgeo.ogr.geometry
+        :rtype: shapely.geometry.base.BaseGeometry
 
         """
-        # Clone route.
-        route_clone = copy.copy(route)
-
-        # Define 4326 CRS
-        source = osr.SpatialReference()
-        source.ImportFromEPSG(4326)
-
-        # Define 3857 CRS
-        target = osr.SpatialReference()
-        target.ImportFromEPSG(3857)
-
-        # Define transformation way (from source to target)
-        transform = osr.CoordinateTransformation(source, target)
-
-        # Transform route clone.
-        route_clone.Transform(transform)
-
-        # Set buffer distance in meters and create buffer around route clone.
-        buffer_distance = 11
-        route_buffer = route_clone.Buffer(buffer_distance)
-
-        # Define transformation way (from target to source)
-        transform = osr.CoordinateTransformation(target, source)
-
-        # Transform route buffer back to original CRS.
-        route_buffer.Transform(transform)
-
-        return route_buffer
+        return BUFFER_ENGINE.create_buffer(route)
 
     def create_geojson_file(self, geom, geomtype, filename):
         """Create GeoJson file for provided geometry.
@@ -99,11 +80,21 @@ class Utility(object):
         # Close DataSources
         out_data_source.Destroy()
 
-    def make_service_request(self, base_url, key, values):
+    def make_service_request(
+            self, base_url, key, values, provider=None, validate=None,
+            cost=1):
         """This function composes url for third-party services apis
         and sends request to the services defined by base_url param.
         For example, requests could be sent to Google and MapQuest apis.
 
+        .. note:: If response cache is enabled and provider is set, response
+            is first looked up in the cache. Only responses accepted by
+            validate function are stored to the cache.
+
+        .. note:: Each attempt of request to service, including retries,
+            waits for provider rate limiter and counts to daily quota.
+            Cached responses don't count to rate limits and daily quota.
+
         :arg base_url: base service url,
             e.g. http://open.mapquestapi.com/directions/v2/route
         :type base_url: string
@@ -114,10 +105,44 @@ class Utility(object):
         :arg values: dictonary with parameters for service api
         :type values: dictionary
 
+        :arg provider: name of service used for cache and rate limits,
+            e.g. 'google'
+        :type provider: string
+
+        :arg validate: function which receives response data and returns
+            False if response must not be cached, e.g. error response
+        :type validate: function
+
+        :arg cost: number of units counted to rate limits and daily quota
+            for each attempt, e.g. number of elements of matrix request
+        :type cost: integer
+
         :returns: service response data
         :rtype: string
 
+        :raises rate_limiter.QuotaExceededError: if daily quota for provider
+            is used up
+
         """
+        use_cache = provider is not None and RESPONSE_CACHE.is_enabled()
+
+        if use_cache:
+            cache_key = RESPONSE_CACHE.create_key(
+                provider=provider,
+                base_url=base_url,
+                values=values
+            )
+            response_data = RESPONSE_CACHE.get(cache_key)
+
+            if response_data is not None:
+                return response_data
+
+        if provider is not None:
+            def before_attempt():
+                RATE_LIMITER.acquire(provider, cost=cost)
+        else:
+            before_attempt = None
+
         # Encode values dict. {"one": 1, "two": 2} --> ?one=1&two=2
         url_values = urllib.urlencode(values)
 
@@ -125,8 +150,60 @@ class Utility(object):
         # messes up (special) characters in key
         full_url = base_url + '?' + 'key=' + key + '&' + url_values
 
-        response = urllib2.urlopen(full_url)
+        response_data = HTTP_CLIENT.get(
+            full_url, before_attempt=before_attempt
+        )
 
-        response_data = response.read()
+        # Response is validated only when it can be stored, so it isn't
+        # parsed twice when cache is disabled.
+        if use_cache and (validate is None or validate(response_data)):
+            RESPONSE_CACHE.put(
+                key=cache_key,
+                provider=provider,
+                response_data=response_data
+            )
 
         return response_data
+
+    def configure_http_client(self, settings):
+        """Changes settings of HTTP client used for service requests.
+
+        :arg settings: dictionary with timeout, retries, backoff and
+            pool_size, e.g. {"timeout": 30, "retries": 3}
+        :type settings: dictionary
+
+        """
+        HTTP_CLIENT.configure(**settings)
+
+    def configure_response_cache(self, settings):
+        """Enables response cache for service requests.
+
+        :arg settings: dictionary with path to cache database, ttl in seconds
+            and max_size_mb, e.g. {"path": "cache.sqlite", "ttl": 86400}
+        :type settings: dictionary
+
+        """
+        RESPONSE_CACHE.configure(**settings)
+
+    def configure_rate_limiter(self, providers, budget_file=None):
+        """Sets rate limits and daily quotas for services.
+
+        :arg providers: dictionary service name --> settings with qps, burst
+            and daily_quota, e.g. {"google": {"qps": 10, "daily_quota": 2500}}
+        :type providers: dictionary
+
+        :arg budget_file: path to file with daily request counts
+        :type budget_file: string
+
+        """
+        RATE_LIMITER.configure(providers=providers, budget_file=budget_file)
+
+    def configure_buffer_engine(self, settings):
+        """Changes settings of buffer engine used for route buffers.
+
+        :arg settings: dictionary with buffer_distance, quad_segs and
+            simplify_tolerance, e.g. {"buffer_distance": 11, "quad_segs": 30}
+        :type settings: dictionary
+
+        """
+        BUFFER_ENGINE.configure(**settings)